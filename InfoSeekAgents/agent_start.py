@@ -1,15 +1,36 @@
 import argparse
+import asyncio
+from collections import deque
 from datetime import datetime
+import heapq
+import itertools
 import json
 import os
+import time
 import traceback
 from tqdm import tqdm
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from copy import deepcopy
-from multiprocessing import Manager
 
 from InfoSeekAgents.config import Config, CFG
 from InfoSeekAgents.agents import InfoSeekAgent, AgentProfile
+from InfoSeekAgents.llms import aclose_llm_clients, get_client_stats
+from InfoSeekAgents.llms.cache import LLM_CACHE_MODES, get_llm_cache_counters
+from InfoSeekAgents.tools.search import get_hedge_stats
+from InfoSeekAgents.tools.search_cache import get_search_cache, get_search_cache_stats
+from InfoSeekAgents.utils.async_utils import run_sync
+from InfoSeekAgents.utils.cache_utils import format_cache_report
+from InfoSeekAgents.utils.fetch_utils import get_fetch_stats
+from InfoSeekAgents.utils.http_utils import get_http_stats
+from InfoSeekAgents.utils.page_cache import get_page_cache, get_page_cache_stats
+from InfoSeekAgents.utils.rate_limit import get_rate_limit_stats, get_state_dir, reset_rate_limits
+from InfoSeekAgents.utils.result_writer import (
+    ResultWriter, is_compressed, load_finished_keys, read_results, write_index, write_results
+)
+from InfoSeekAgents.utils.retry_utils import AdaptiveLimit, RetryPolicy, get_breaker_stats
+from InfoSeekAgents.utils.selenium_utils import get_driver_pool_stats
+from InfoSeekAgents.utils.trace_store import format_trace_report, get_trace_store, store_trace
 
 
 class AgentService(object):
@@ -34,6 +55,19 @@ class AgentService(object):
         cfg.print_to_console = input_dict.get("print_to_console", False)
         cfg.wo_tool = input_dict.get("wo_tool", False)
         cfg.lang_aware = input_dict.get('lang_aware', False)
+        cfg.answer_max_concurrency = input_dict.get("answer_max_concurrency", 5)
+        cfg.search_cache_path = input_dict.get("search_cache_path", None)
+        cfg.search_cache_ttl = input_dict.get("search_cache_ttl", cfg.search_cache_ttl)
+        cfg.search_cache_stale_ttl = input_dict.get("search_cache_stale_ttl", cfg.search_cache_stale_ttl)
+        cfg.hedge_search = input_dict.get("hedge_search", False)
+        cfg.search_hedge_delay = input_dict.get("search_hedge_delay", cfg.search_hedge_delay)
+        cfg.search_hedge_timeout = input_dict.get("search_hedge_timeout", cfg.search_hedge_timeout)
+        cfg.search_crawler_pages = input_dict.get("search_crawler_pages", cfg.search_crawler_pages)
+        cfg.search_prefetch = input_dict.get("search_prefetch", False)
+        cfg.page_cache_path = input_dict.get("page_cache_path", None)
+        cfg.page_cache_ttl = input_dict.get("page_cache_ttl", cfg.page_cache_ttl)
+        cfg.page_cache_max_mb = input_dict.get("page_cache_max_mb", cfg.page_cache_max_mb)
+        cfg.rate_limit_dir = input_dict.get("rate_limit_dir", None)
 
         return cfg
 
@@ -47,6 +81,9 @@ class AgentService(object):
         return history
 
     def chat(self, input_dict):
+        return run_sync(self.achat(input_dict))
+
+    async def achat(self, input_dict):
         s = "============ INPUT_DICT ============\n"
         for key, val in input_dict.items():
             s += f"· {key.upper()}:\t{val}\n"
@@ -67,7 +104,7 @@ class AgentService(object):
             print("\033[95m\033[1m" + "\n***** Question *****" + "\033[0m\033[0m")
             print(input_dict["query"])
 
-            agent_results = agent.chat(
+            agent_results = await agent.achat(
                 input_dict["query"], 
                 history=history)
 
@@ -106,11 +143,8 @@ def save_results(results, output_path):
 
 
 def get_unfinished_data(res_path, current_queries, query_key):
-    """get unfinished queries"""
-    with open(res_path, 'r', encoding='utf-8', errors='replace') as file:
-        previous_results = [json.loads(line) for line in file]
-
-    processed_ids = set([query[query_key] for query in previous_results])
+    """get unfinished queries, from the index of the result file"""
+    processed_ids = set(load_finished_keys(res_path, query_key))
     print("Current finished queries: ", len(processed_ids))
     query_data = [query for query in current_queries if query[query_key] not in processed_ids]
     print("Unfinished queries: ", len(query_data))
@@ -119,10 +153,7 @@ def get_unfinished_data(res_path, current_queries, query_key):
 
 def get_unfinished_data_and_overwrite(res_path, current_queries, query_key):
     """get finished queries and overwrite"""
-    previous_results = []
-    with open(res_path, 'r', encoding='utf-8', errors='replace') as file:
-        for i, line in enumerate(file):
-            previous_results.append(json.loads(line))
+    previous_results = list(read_results(res_path))
 
     processed_ids = {query[query_key]: query for query in previous_results}
     cur_query_dict = {query[query_key]: query for query in current_queries}
@@ -138,27 +169,192 @@ def get_unfinished_data_and_overwrite(res_path, current_queries, query_key):
             exist_queries.append(new_value)
 
     print("Existing finished queries: ", len(exist_queries), 'overwriting...')
-    with open(res_path, 'w', encoding='utf-8') as file:
-        for query in exist_queries:
-            json.dump(query, file, ensure_ascii=False)
-            file.write('\n')
+    write_results(res_path, exist_queries)
+    write_index(res_path, query_key, [query[query_key] for query in exist_queries])
     query_data = [query for query in current_queries if query[query_key] not in processed_ids]
     print("Unfinished queries: ", len(query_data))
     return query_data
 
 
-def process_query(query, args, output_path, lock):
-    """process each query"""
+def get_worker_stats():
+    """snapshot of the cumulative stats of the current worker process"""
+    return {
+        "pid": os.getpid(),
+        "llm_clients": get_client_stats(),
+        "webdrivers": get_driver_pool_stats(),
+        "browse": get_fetch_stats(),
+        "http": get_http_stats(),
+        "search": get_hedge_stats(),
+        "search_cache": get_search_cache_stats(),
+        "page_cache": get_page_cache_stats(),
+        "rate_limits": get_rate_limit_stats(),
+        "circuit_breakers": get_breaker_stats(),
+    }
+
+
+def report_worker_stats(worker_stats):
+    """sum the latest snapshot of every worker and print it"""
+    sections = {}
+    for stats in worker_stats.values():
+        for section, section_stats in stats.items():
+            if section == "pid":
+                continue
+            for key, counters in section_stats.items():
+                total = sections.setdefault(section, {}).setdefault(key, {})
+                for name, val in counters.items():
+                    total[name] = total.get(name, 0) + val
+    print(f"Stats over {len(worker_stats)} workers:")
+    for section, section_stats in sections.items():
+        for key, total in section_stats.items():
+            print(f"  [{section}] {key}: " + ", ".join(f"{name}={val}" for name, val in total.items()))
+
+
+def is_finished(query):
+    """whether a processed query has a result worth saving"""
+    result = query.get('result')
+    return result is not None and result['response'] != 'error' and len(result["more_info"]) > 0
+
+
+def process_query(query, args):
+    """process each query, the main process saves the result"""
     try:
         agent_service = AgentService()
         args.query = query['query_en'] if args.lang == 'en' else query['query_zh']
         result = agent_service.chat(vars(args))
         query['result'] = result
-        if result['response'] != 'error' and len(result["more_info"]) > 0:
-            with lock:
-                with open(output_path, 'a', encoding='utf-8') as file:
-                    json.dump(query, file, ensure_ascii=False)
-                    file.write('\n')
+        if args.trace_store and is_finished(query):
+            query['result'] = store_trace(get_trace_store(args.trace_store), result)
+    except KeyboardInterrupt:
+        exit()
+    except Exception as e:
+        print(f"Error processing query {query['id']}: {e}")
+    return query, get_worker_stats()
+
+
+WORKER_ARGS = None
+
+
+def init_worker(args):
+    """runs once in every worker process, so that args are not pickled with every query"""
+    global WORKER_ARGS
+    WORKER_ARGS = args
+
+
+def process_worker_query(query):
+    return process_query(query, WORKER_ARGS)
+
+
+def count_rate_limited(stats):
+    """number of rate limited responses in a snapshot of the stats of a worker
+
+    The 429s of every host, LLM endpoints included, are counted in the http section, the LLM
+    calls that failed with a rate limit error after the SDK retries in the llm_clients section,
+    so such a call counts twice. Only an increase matters to the adaptive limit.
+    """
+    return sum(counters.get("rate_limited", 0)
+               for section, section_stats in stats.items() if section != "pid"
+               for counters in section_stats.values())
+
+
+def run_queries(query_data, args, writer, worker_stats):
+    """stream queries to the process pool, retrying failed ones with backoff, at an adaptive concurrency
+
+    Queries are submitted as workers free up, at most `limit` in flight. A failed query is retried
+    after a jittered backoff while the others go on, up to `args.max_retry` attempts. The limit starts
+    at `args.num_worker` and adapts to the rate limited responses each query ran into. When a worker
+    dies, breaking the pool, the queries in flight are retried the same way on a new pool.
+    """
+    policy = RetryPolicy(max_attempts=args.max_retry, base=args.retry_base, cap=args.retry_cap)
+    limit = AdaptiveLimit(args.num_worker)
+    pending = deque((query, 0) for query in query_data)
+    backoff = []  # heap of (retry time, seq, query, attempt)
+    seq = itertools.count()
+    in_flight = {}
+    rate_limited = {}
+    counts = {"finished": 0, "retries": 0, "failed": 0, "pool_restarts": 0}
+
+    def new_executor():
+        return ProcessPoolExecutor(max_workers=args.num_worker, initializer=init_worker, initargs=(args,))
+
+    def retry(query, attempt):
+        if attempt + 1 < policy.max_attempts:
+            heapq.heappush(backoff, (time.time() + policy.delay(attempt), next(seq), query, attempt + 1))
+            counts["retries"] += 1
+        else:
+            counts["failed"] += 1
+            progress.update()
+
+    executor = new_executor()
+    try:
+        with tqdm(total=len(query_data), desc="Processing") as progress:
+            while pending or backoff or in_flight:
+                broken = False
+                while backoff and backoff[0][0] <= time.time():
+                    _, _, query, attempt = heapq.heappop(backoff)
+                    pending.appendleft((query, attempt))
+                while pending and len(in_flight) < limit.limit:
+                    query, attempt = pending.popleft()
+                    try:
+                        future = executor.submit(process_worker_query, query)
+                    except BrokenProcessPool:
+                        pending.appendleft((query, attempt))
+                        broken = True
+                        break
+                    in_flight[future] = (query, attempt, time.time())
+                timeout = max(0., backoff[0][0] - time.time()) if backoff else None
+                if not in_flight and not broken:
+                    time.sleep(timeout)
+                    continue
+                done, _ = wait(in_flight, timeout=0 if broken else timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    query, attempt, started_at = in_flight.pop(future)
+                    try:
+                        result, stats = future.result()
+                    except KeyboardInterrupt:
+                        exit()
+                    except BrokenProcessPool:
+                        print(f"Worker died processing query {query['id']} or another query in flight")
+                        result, stats = query, None
+                        broken = True
+                    except Exception as e:
+                        print(f"Error processing query {query['id']}: {e}")
+                        result, stats = query, None
+                    if stats is not None:
+                        worker_stats[stats["pid"]] = stats
+                        total = count_rate_limited(stats)
+                        limit.record(total > rate_limited.get(stats["pid"], 0), started_at)
+                        rate_limited[stats["pid"]] = total
+                    if is_finished(result):
+                        writer.put(result)
+                        counts["finished"] += 1
+                        progress.update()
+                    else:
+                        retry(result, attempt)
+                if broken:
+                    # every query still in flight was lost with the pool
+                    for future, (query, attempt, _) in list(in_flight.items()):
+                        retry(query, attempt)
+                    in_flight.clear()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = new_executor()
+                    counts["pool_restarts"] += 1
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    print(f"Scheduler: {counts['finished']} finished, {counts['retries']} retries, {counts['failed']} failed, "
+          f"{counts['pool_restarts']} pool restarts, "
+          f"concurrency {limit.limit}/{limit.max_limit} (lowest {limit.stats['lowest']}), "
+          f"{limit.stats['decreases']} decreases, {limit.stats['increases']} increases")
+
+
+async def aprocess_query(query, args):
+    """process each query on the running event loop"""
+    try:
+        agent_service = AgentService()
+        input_dict = dict(vars(args), query=query['query_en'] if args.lang == 'en' else query['query_zh'])
+        result = await agent_service.achat(input_dict)
+        query['result'] = result
+        if args.trace_store and is_finished(query):
+            query['result'] = await asyncio.to_thread(store_trace, get_trace_store(args.trace_store), result)
     except KeyboardInterrupt:
         exit()
     except Exception as e:
@@ -166,6 +362,33 @@ def process_query(query, args, output_path, lock):
     return query
 
 
+async def run_queries_async(query_data, args, writer):
+    """drive all queries from one event loop, at most `args.concurrency` at a time
+
+    A failed query is retried after a jittered backoff, up to `args.max_retry` attempts.
+    """
+    semaphore = asyncio.Semaphore(args.concurrency)
+    policy = RetryPolicy(max_attempts=args.max_retry, base=args.retry_base, cap=args.retry_cap)
+
+    async def bounded_process_query(query):
+        for attempt in range(policy.max_attempts):
+            if attempt:
+                await asyncio.sleep(policy.delay(attempt - 1))
+            async with semaphore:
+                query = await aprocess_query(query, args)
+            if is_finished(query):
+                writer.put(query)
+                break
+        return query
+
+    tasks = [asyncio.ensure_future(bounded_process_query(query)) for query in query_data]
+    try:
+        for future in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Processing"):
+            await future
+    finally:
+        await aclose_llm_clients()
+
+
 def main():
     parser = argparse.ArgumentParser()
 
@@ -204,6 +427,67 @@ def main():
                         help="Maximum number of token, default 4096")
     parser.add_argument("--num_worker", type=int, default=3,
                         help="Number of worker for multi-processing, default 3")
+    parser.add_argument("--async_mode", default=False, action='store_true',
+                        help="Whether to run all queries on one event loop instead of a process pool, default False")
+    parser.add_argument("--concurrency", type=int, default=32,
+                        help="Max number of concurrent queries in async mode, default 32")
+    parser.add_argument("--llm_max_concurrency", type=int, default=16,
+                        help="Max number of concurrent requests per LLM provider in async mode, default 16")
+    parser.add_argument("--answer_max_concurrency", type=int, default=5,
+                        help="Max number of answer@k prompts of one query generated concurrently, default 5")
+    parser.add_argument("--llm_cache_path", type=str, default=None,
+                        help="SQLite file caching LLM responses across runs, default None (no cache)")
+    parser.add_argument("--llm_cache_mode", type=str, default="readwrite", choices=LLM_CACHE_MODES,
+                        help="readwrite, readonly, or replay (misses fail instead of calling the API), default readwrite")
+    parser.add_argument("--llm_cache_max_mb", type=int, default=1024,
+                        help="Size of the LLM response cache above which least recently used entries are evicted, default 1024")
+    parser.add_argument("--search_cache_path", type=str, default=None,
+                        help="SQLite file caching search results across workers and runs, default None (no cache)")
+    parser.add_argument("--search_cache_ttl", type=float, default=7 * 24 * 3600,
+                        help="Seconds during which cached search results are fresh, default 7 days")
+    parser.add_argument("--search_cache_stale_ttl", type=float, default=30 * 24 * 3600,
+                        help="Seconds after the TTL during which stale results are served and refreshed "
+                             "in the background, default 30 days")
+    parser.add_argument("--hedge_search", default=False, action='store_true',
+                        help="Whether to race the search providers of the search type, launching a backup "
+                             "when the primary is slow, default False")
+    parser.add_argument("--search_hedge_delay", type=float, default=2.0,
+                        help="Seconds without a search result before the next provider is launched, default 2")
+    parser.add_argument("--search_hedge_timeout", type=float, default=60.0,
+                        help="Seconds after which a hedged search gives up on the providers still running, "
+                             "default 60")
+    parser.add_argument("--search_crawler_pages", type=int, default=1,
+                        help="Max result pages a search crawler goes through, it stops once max_search_nums "
+                             "results are found, default 1")
+    parser.add_argument("--search_prefetch", default=False, action='store_true',
+                        help="Whether search crawlers fetch the next result page while parsing the current one, "
+                             "default False")
+    parser.add_argument("--page_cache_path", type=str, default=None,
+                        help="SQLite file caching browsed pages and their chunk summaries, default None (no cache)")
+    parser.add_argument("--page_cache_ttl", type=float, default=24 * 3600,
+                        help="Seconds during which a cached page is used without revalidation, default 1 day")
+    parser.add_argument("--page_cache_max_mb", type=int, default=1024,
+                        help="Size of the page cache above which least recently used entries are evicted, default 1024")
+    parser.add_argument("--rate_limit_dir", type=str, default=None,
+                        help="Directory of the search rate limits shared by the workers of a run, reset at "
+                             "startup, default a new directory of the run in the temp dir")
+    parser.add_argument("--max_retry", type=int, default=3,
+                        help="Max number of attempts of a query, default 3")
+    parser.add_argument("--retry_base", type=float, default=10,
+                        help="Base of the jittered exponential backoff before retrying a query, in seconds, default 10")
+    parser.add_argument("--retry_cap", type=float, default=120,
+                        help="Max backoff before retrying a query, in seconds, default 120")
+    parser.add_argument("--compress_output", default=False, action='store_true',
+                        help="Whether to gzip the output file, adding a .gz suffix, default False")
+    parser.add_argument("--write_batch_size", type=int, default=64,
+                        help="Max number of results appended to the output file at once, default 64")
+    parser.add_argument("--fsync_interval", type=float, default=5.0,
+                        help="Min seconds between two fsyncs of the output file, default 5")
+    parser.add_argument("--trace_store", type=str, default=None,
+                        help="SQLite file storing the history and LLM prompts/responses of every result, which "
+                             "only keeps their trace_id, default <output path>.traces.sqlite")
+    parser.add_argument("--inline_traces", default=False, action='store_true',
+                        help="Whether to keep the history and LLM prompts/responses in the output file, default False")
     parser.add_argument("--wo_tool", default=False, action='store_true',
                         help="Whether to let LLMs direct answer the query without search, default False")
     parser.add_argument("--overwrite", default=False, action='store_true',
@@ -216,6 +500,12 @@ def main():
     CFG.local_llm_host = args.local_llm_host
     CFG.local_llm_port = args.local_llm_port
     CFG.use_local_llm = args.use_local_llm
+    CFG.llm_max_concurrency = args.llm_max_concurrency
+    CFG.llm_cache_path = args.llm_cache_path
+    CFG.llm_cache_mode = args.llm_cache_mode if args.llm_cache_path else "off"
+    CFG.llm_cache_max_mb = args.llm_cache_max_mb
+    args.rate_limit_dir = args.rate_limit_dir or get_state_dir(f"run_{os.getpid()}_{int(time.time())}")
+    reset_rate_limits(args.rate_limit_dir)
 
     if args.query_path:
         # process a list of queries from file
@@ -229,7 +519,12 @@ def main():
                                     f'{file_name}_result_{args.lang}_{args.llm_name}_{args.max_iter_num}_{args.max_webpage_num}_wotool_{args.wo_tool}_{args.search_type}{lang_aware_str}.jsonl')
         else:
             res_path = args.output_path
+        if args.compress_output and not is_compressed(res_path):
+            res_path += '.gz'
         print("output path", args.output_path, res_path)
+        args.trace_store = None if args.inline_traces else args.trace_store or res_path + '.traces.sqlite'
+        trace_store = get_trace_store(args.trace_store) if args.trace_store else None
+        trace_counters = trace_store.counters() if trace_store is not None else None
 
         query_key = f'query_{args.lang}'
         if os.path.exists(res_path):
@@ -240,25 +535,36 @@ def main():
         else:
             print(f"No finished queries, process a new dataset with {len(query_data)} queries")
 
-        max_retry = 3
-        retry = 0
-        while query_data and retry < max_retry:
-            with Manager() as manager:
-                lock = manager.Lock()
-                with ProcessPoolExecutor(max_workers=args.num_worker) as executor:
-                    future_to_query = {executor.submit(process_query, query, args, res_path, lock): query
-                                       for query in query_data}
-                    for future in tqdm(as_completed(future_to_query), total=len(query_data), desc="Processing"):
-                        query = future_to_query[future]
-                        try:
-                            future.result()
-                        except KeyboardInterrupt:
-                            exit()
-                        except Exception as e:
-                            print(f"Error processing query {query['id']}: {e}")
-            retry += 1
-            query_data = get_unfinished_data(res_path, query_data, query_key)
+        worker_stats = {}
+        cache_counters = get_llm_cache_counters()
+        run_cfg = AgentService.parse_config(vars(args))
+        search_cache, page_cache = get_search_cache(run_cfg), get_page_cache(run_cfg)
+        search_cache_counters = search_cache.counters() if search_cache is not None else None
+        page_cache_counters = page_cache.counters() if page_cache is not None else None
+        # results are appended by one writer thread of the main process, workers only return them
+        with ResultWriter(res_path, key=query_key, batch_size=args.write_batch_size,
+                          fsync_interval=args.fsync_interval) as writer:
+            if query_data and args.async_mode:
+                asyncio.run(run_queries_async(query_data, args, writer))
+                worker_stats[os.getpid()] = get_worker_stats()
+            elif query_data:
+                run_queries(query_data, args, writer, worker_stats)
+            writer.sync()
+            get_unfinished_data(res_path, query_data, query_key)
+        report_worker_stats(worker_stats)
+        print(writer.report())
+        if trace_store is not None:
+            print(format_trace_report(trace_counters, trace_store.counters()))
+        if CFG.llm_cache_mode != "off":
+            print(format_cache_report("LLM cache", cache_counters, get_llm_cache_counters()))
+        if search_cache is not None:
+            print(format_cache_report("Search cache", search_cache_counters, search_cache.counters()))
+        if page_cache is not None:
+            print(format_cache_report("Page cache", page_cache_counters, page_cache.counters(), prefix="page_"))
+            print(format_cache_report("Summary cache", page_cache_counters, page_cache.counters(), prefix="summary_"))
         print('Results saved in', res_path)
+        if trace_store is not None:
+            print('Traces saved in', args.trace_store)
     else:
         # process one query
         args.print_to_console = True
@@ -1,3 +1,4 @@
+import asyncio
 from collections import deque
 import json
 import logging
@@ -8,15 +9,15 @@ import time
 import traceback
 from typing import Dict, List
 import uuid
-from transformers import AutoTokenizer
-from pathlib import Path
 
 from InfoSeekAgents.tools import ALL_NO_TOOLS, ALL_TOOLS, FinishTool, NoTool
-from InfoSeekAgents.llms import create_chat_completion
+from InfoSeekAgents.llms import acreate_chat_completion
 from InfoSeekAgents.agents.prompts import make_planning_prompt, make_task_answer_prompt, make_task_ranking_prompt
 from InfoSeekAgents.agents.prompts import make_no_task_conclusion_prompt, make_task_conclusion_prompt
+from InfoSeekAgents.utils.async_utils import run_sync
 from InfoSeekAgents.utils.chain_logger import *
 from InfoSeekAgents.utils.json_fix_general import find_json_dict, correct_json, find_json_list
+from InfoSeekAgents.utils.tokenizer_utils import get_tokenizer
 
 
 class SingleTaskListStorage:
@@ -74,20 +75,7 @@ class InfoSeekAgent(object):
         pass
     
     def initialize_tokenizer(self, llm_name):
-        if "baichuan" in llm_name:
-            model_name = "kwaikeg/kagentlms_baichuan2_13b_mat"
-        elif "qwen_7b" in llm_name:
-            model_name = "kwaikeg/kagentlms_qwen_7b_mat"
-        else:
-            model_name = str(Path(__file__).parent.parent / 'resources/gpt2')
-        print(model_name)
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name,
-            use_fast=False,
-            padding_side='left',
-            trust_remote_code=True
-        )
-        return tokenizer
+        return get_tokenizer(llm_name)
 
     def tool_retrival(self, tools):
         if tools:
@@ -128,10 +116,13 @@ class InfoSeekAgent(object):
         return memory
 
     def task_plan(self, goal, memory):
+        return run_sync(self.atask_plan(goal, memory))
+
+    async def atask_plan(self, goal, memory):
         prompt = make_planning_prompt(self.agent_profile, goal, self.tools, memory, self.cfg.max_tokens_num,
                                       self.tokenizer, lang=self.lang, language_aware=self.cfg.lang_aware)
         try:
-            response, _ = create_chat_completion(
+            response, _ = await acreate_chat_completion(
                 query=prompt, llm_model_name=self.cfg.smart_llm_model)
             self.chain_logger.put_prompt_response(
                 prompt=prompt, 
@@ -151,6 +142,9 @@ class InfoSeekAgent(object):
         return new_tasks
 
     def tool_use(self, command) -> str:
+        return run_sync(self.atool_use(command))
+
+    async def atool_use(self, command) -> str:
         try:
             command_name = command.get("name", "")
             if command_name == "search":
@@ -164,7 +158,7 @@ class InfoSeekAgent(object):
                 raise RuntimeError("has no tool named {}".format(command_name))
             tool = self.name2tools[command_name]
 
-            tool_output = tool(**command["args"])
+            tool_output = await tool.acall(**command["args"])
             self.chain_logger.put("observation", tool_output.answer_md)
 
             for prompt, response in tool_output.prompt_responses:
@@ -191,7 +185,30 @@ class InfoSeekAgent(object):
                    max_webpage_num: int = 5,
                    no_task_planned: bool = False
                    ):
+        return run_sync(self.aconclusion(goal, memory, conversation_history, is_rank=is_rank,
+                                            max_webpage_num=max_webpage_num, no_task_planned=no_task_planned))
+
+    async def aconclusion(self,
+                          goal: str,
+                          memory,
+                          conversation_history: List[List],
+                          is_rank: bool=True,
+                          max_webpage_num: int = 5,
+                          no_task_planned: bool = False
+                          ):
+        prompt, response = await self._aconclusion(goal, memory, conversation_history, is_rank=is_rank,
+                                                   max_webpage_num=max_webpage_num, no_task_planned=no_task_planned)
+        self._log_conclusion(prompt, response)
+        return response
 
+    async def _aconclusion(self,
+                           goal: str,
+                           memory,
+                           conversation_history: List[List],
+                           is_rank: bool=True,
+                           max_webpage_num: int = 5,
+                           no_task_planned: bool = False
+                           ):
         if no_task_planned:
             prompt = make_no_task_conclusion_prompt(goal, conversation_history)
         else:
@@ -200,36 +217,65 @@ class InfoSeekAgent(object):
             else:
                 prompt = make_task_conclusion_prompt(self.agent_profile, goal, memory, self.cfg.max_tokens_num, self.tokenizer, lang=self.lang)
 
-        response, _ = create_chat_completion(
+        response, _ = await acreate_chat_completion(
             query=prompt, 
             chat_id="kwaiagents_conclude_" + self.session_id,
             llm_model_name=self.cfg.smart_llm_model)
+        return prompt, response
 
+    def _log_conclusion(self, prompt, response):
         self.chain_logger.put_prompt_response(
             prompt=prompt, 
             response=response, 
             session_id=self.session_id, 
             mtype="auto_conclusion",
             llm_name=self.cfg.smart_llm_model)
-        return response
 
     def answer(self, goal, webpages, k):
+        return run_sync(self.aanswer(goal, webpages, k))
+
+    async def aanswer(self, goal, webpages, k):
+        prompt, response = await self._aanswer(goal, webpages, k)
+        self._log_answer(prompt, response)
+        return response
+
+    async def _aanswer(self, goal, webpages, k):
         prompt = make_task_answer_prompt(self.agent_profile, goal, webpages[:k], lang=self.lang)
         # print(f'\n************** ANSWER AGENT PROMPT {k}*************')
         # print(prompt)
 
-        response, _ = create_chat_completion(
+        response, _ = await acreate_chat_completion(
             query=prompt,
             chat_id=f"kwaiagents_answer_{k}_{self.session_id}",
             llm_model_name=self.cfg.smart_llm_model)
+        return prompt, response
 
+    def _log_answer(self, prompt, response):
         self.chain_logger.put_prompt_response(
             prompt=prompt,
             response=response,
             session_id=self.session_id,
             mtype="auto_answer",
             llm_name=self.cfg.smart_llm_model)
-        return response
+
+    async def answer_at_k(self, goal, webpages):
+        """Generate answer@k for k = 1..len(webpages) concurrently, returned in k order
+
+        At most `cfg.answer_max_concurrency` answer prompts of this query are in flight at once.
+        """
+        semaphore = asyncio.Semaphore(self.cfg.answer_max_concurrency)
+
+        async def bounded_answer(k):
+            async with semaphore:
+                return await self._aanswer(goal, webpages, k)
+
+        prompt_responses = await asyncio.gather(*[bounded_answer(k + 1) for k in range(len(webpages))])
+        conclusion_k = {}
+        for k, (prompt, response) in enumerate(prompt_responses):
+            self._log_answer(prompt, response)
+            conclusion_k[k + 1] = response
+            self.chain_logger.put(f"answer", f"answer_at_{k + 1}:\n" + response)
+        return conclusion_k
 
     def check_task_complete(self, task, iter_id):
         command_name = task["command"]["name"]
@@ -253,13 +299,16 @@ class InfoSeekAgent(object):
             return False
 
     def chat(self, query, history=list(), max_webpage_num=5, *args, **kwargs):
+        return run_sync(self.achat(query, history, max_webpage_num, *args, **kwargs))
+
+    async def achat(self, query, history=list(), max_webpage_num=5, *args, **kwargs):
         goal = query
         res_info = {}
         new_history = []
         offline_conclusion = None
         if not self.tools:
             no_task_planned = True
-            conclusion = self.conclusion(
+            conclusion = await self.aconclusion(
                 goal,
                 memory="",
                 conversation_history=history,
@@ -268,6 +317,8 @@ class InfoSeekAgent(object):
 
             new_history = history[:] + [{"query": query, "answer": conclusion}]
         else:
+            stage_timings = {}
+            stage_start = time.time()
             tasks_storage = SingleTaskListStorage()
             tasks_storage.clear()
 
@@ -290,7 +341,7 @@ class InfoSeekAgent(object):
 
                         self.chain_logger.put("thought", task.get("task_name", ""))
 
-                        result = self.tool_use(task["command"])
+                        result = await self.atool_use(task["command"])
 
                         task["result"] = result
                         complete_task_list.append(task)
@@ -300,7 +351,7 @@ class InfoSeekAgent(object):
                         break
                     self.chain_logger.put("thinking")
                     memory = self.memory_retrival(goal, history, complete_task_list)
-                    new_tasks = self.task_plan(goal, memory)
+                    new_tasks = await self.atask_plan(goal, memory)
 
                     for new_task in new_tasks:
                         new_task.update({"task_id": tasks_storage.next_task_id()})
@@ -311,42 +362,50 @@ class InfoSeekAgent(object):
                     self.chain_logger.put("finish", logging_finish_task_msg(self.lang))
 
             memory = self.memory_retrival(goal, history, complete_task_list)
+            stage_timings["retrieval"] = time.time() - stage_start
 
-            conclusion = self.conclusion(
-                goal,
-                memory=memory,
-                conversation_history=history,
-                is_rank=False,
-                max_webpage_num=max_webpage_num,
-                no_task_planned=no_task_planned)
-
-            self.chain_logger.put("conclusion", "online:\n" + conclusion)
-
+            # online conclusion, offline conclusion and ranking do not depend on each other
+            stage_start = time.time()
+            stage = [
+                self._aconclusion(
+                    goal,
+                    memory=memory,
+                    conversation_history=history,
+                    is_rank=False,
+                    max_webpage_num=max_webpage_num,
+                    no_task_planned=no_task_planned),
+            ]
             if self.cfg.wo_tool:
-                offline_conclusion = self.conclusion(
+                stage.append(self._aconclusion(
                     goal,
                     memory="",
                     conversation_history=history,
-                    no_task_planned=True)
-
-                self.chain_logger.put("conclusion", "offline:\n" + offline_conclusion)
-
-            webpage_resp = self.conclusion(
+                    no_task_planned=True))
+            stage.append(self._aconclusion(
                 goal,
                 memory=memory,
                 conversation_history=history,
                 is_rank=True,
                 max_webpage_num=max_webpage_num,
-                no_task_planned=no_task_planned)
+                no_task_planned=no_task_planned))
+            stage_results = await asyncio.gather(*stage)
+            stage_timings["conclusion"] = time.time() - stage_start
+
+            for prompt, response in stage_results:
+                self._log_conclusion(prompt, response)
+            conclusion = stage_results[0][1]
+            self.chain_logger.put("conclusion", "online:\n" + conclusion)
+            if self.cfg.wo_tool:
+                offline_conclusion = stage_results[1][1]
+                self.chain_logger.put("conclusion", "offline:\n" + offline_conclusion)
+            webpage_resp = stage_results[-1][1]
 
             webpages = json.loads(correct_json(find_json_list(webpage_resp)))
 
             self.chain_logger.put("ranking", json.dumps(webpages, ensure_ascii=False))
-            conclusion_k = {}
-            for k in range(len(webpages)):
-                answer = self.answer(goal, webpages=webpages, k=k+1)
-                conclusion_k[k+1] = answer
-                self.chain_logger.put(f"answer", f"answer_at_{k+1}:\n" + answer)
+            stage_start = time.time()
+            conclusion_k = await self.answer_at_k(goal, webpages)
+            stage_timings["answer"] = time.time() - stage_start
 
             if len(webpages) == 0:
                 for k in range(max_webpage_num):
@@ -359,6 +418,7 @@ class InfoSeekAgent(object):
                 "ranked_webpages": webpages,
                 "answer_at_k": conclusion_k,
                 "offline_response": offline_conclusion,  # directly answer without online search
+                "stage_timings": stage_timings,  # wall-clock seconds per stage
             }
 
         return {
@@ -359,28 +359,37 @@ def make_task_answer_prompt(agent_profile, goal, webpages, lang="en"):
     return prompt
 
 
+def truncate_middle(tokens, max_length):
+    """Keeps the first and last tokens of `tokens`, `max_length` in all"""
+    if len(tokens) <= max_length:
+        return tokens
+    if max_length <= 0:
+        return []
+    return tokens[:max_length // 2] + tokens[len(tokens) - (max_length - max_length // 2):]
+
+
 def prompt_truncate(tokenizer, prompt, memory, input_max_length):
+    """Truncate the prompt to `input_max_length` tokens, cutting the middle of `memory` first
+
+    The prompt is split around the memory span by character offset, so every piece is
+    encoded once and only the truncated memory is decoded back to text. When the rest of
+    the prompt alone exceeds the budget, the middle of the whole prompt is cut instead.
+    """
     kwargs = dict(add_special_tokens=False)
+    start_index = prompt.find(memory) if memory else -1
+    if start_index >= 0:
+        prefix = prompt[:start_index]
+        suffix = prompt[start_index + len(memory):]
+        other_len = len(tokenizer.encode(prefix, **kwargs)) + len(tokenizer.encode(suffix, **kwargs))
+        memory_prompt_tokens = tokenizer.encode(memory, **kwargs)
+        if other_len + len(memory_prompt_tokens) <= input_max_length:
+            return prompt
+        if other_len < input_max_length:
+            memory_prompt_tokens = truncate_middle(memory_prompt_tokens, input_max_length - other_len)
+            memory = tokenizer.decode(memory_prompt_tokens, skip_special_tokens=True)
+            return prefix + memory + suffix
+
     prompt_tokens = tokenizer.encode(prompt, **kwargs)
-    if len(prompt_tokens) > input_max_length:
-        if memory is None or memory not in prompt:
-            prompt_tokens = prompt_tokens[:input_max_length//2] + prompt_tokens[-input_max_length//2:]
-        else:
-            memory_prompt_tokens = tokenizer.encode(memory, add_special_tokens=False)
-            sublst_len = len(memory_prompt_tokens)
-            start_index = None
-            for i in range(len(prompt_tokens) - sublst_len + 1):
-                if prompt_tokens[i:i+sublst_len] == memory_prompt_tokens:
-                    start_index = i
-                    break
-            
-            if start_index is None:
-                prompt_tokens = prompt_tokens[:input_max_length//2] + prompt_tokens[-input_max_length//2:]
-            else:
-                other_len = len(prompt_tokens) - sublst_len
-                if input_max_length > other_len:
-                    max_memory_len = input_max_length - other_len
-                    memory_prompt_tokens = memory_prompt_tokens[:max_memory_len//2] + memory_prompt_tokens[-max_memory_len//2:]
-                    prompt_tokens = prompt_tokens[:start_index] + memory_prompt_tokens + prompt_tokens[start_index + sublst_len:]
-    prompt = tokenizer.decode(prompt_tokens, skip_special_tokens=True)
-    return prompt
\ No newline at end of file
+    if len(prompt_tokens) <= input_max_length:
+        return prompt
+    return tokenizer.decode(truncate_middle(prompt_tokens, input_max_length), skip_special_tokens=True)
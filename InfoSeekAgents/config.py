@@ -10,12 +10,65 @@ class Config(object):
         self.smart_llm_model = "gpt-4"
         self.use_local_llm = False
         self.search_type = "ddg"
+        self.search_cache_path = None
+        self.search_cache_ttl = 7 * 24 * 3600
+        self.search_cache_stale_ttl = 30 * 24 * 3600
+        self.search_cache_max_mb = 256
+        # (requests per second, burst) per provider, shared by all workers of a run
+        self.search_rate_limits = {
+            "ddg_api": (1, 2),
+            "google_api": (5, 5),
+            "bing_api": (1, 2),
+            "yahoo_api": (1, 2),
+            "ddg_crawler": (0.5, 2),
+            "google_crawler": (0.5, 2),
+            "bing_crawler": (0.5, 2),
+            "yahoo_crawler": (0.5, 2),
+        }
+        self.rate_limit_dir = None
+        self.search_retry_base = 1
+        self.search_retry_cap = 30
+        self.breaker_failure_threshold = 3
+        self.breaker_cooldown = 120
+        # providers raced by a hedged search, per search type, in launch order
+        self.hedge_search = False
+        self.search_hedge_delay = 2.0
+        self.search_hedge_timeout = 60.0
+        # result pages a crawler provider goes through, stopping early once max_search_nums results are found
+        self.search_crawler_pages = 1
+        self.search_prefetch = False
+        self.search_hedge_providers = {
+            "ddg": ["ddg_api", "bing_api", "ddg_crawler"],
+            "google": ["google_api", "bing_api", "google_crawler"],
+            "bing": ["bing_api", "google_api", "bing_crawler"],
+            "yahoo": ["yahoo_api", "bing_api", "yahoo_crawler"],
+        }
         self.local_llm_host = "localhost"
         self.local_llm_port = 8888
         self.browse_chunk_max_length = 4096
         self.browse_summary_max_token = 300
+        self.browse_summary_max_concurrency = 4
         self.selenium_web_browser = "chrome"
+        self.browse_http_first = True
+        self.browse_http_timeout = 10
+        self.browse_min_text_length = 500
+        self.page_cache_path = None
+        self.page_cache_ttl = 24 * 3600
+        self.page_cache_max_mb = 1024
+        self.selenium_pool_size = 2
+        self.selenium_max_pages_per_driver = 20
+        self.selenium_checkout_timeout = 300
+        self.http_pool_hosts = 64
+        self.http_pool_maxsize = 16
+        self.http_timeout = 30
+        self.http_max_retries = 2
         self.llm_max_retries = 5
+        self.llm_max_concurrency = 16
+        self.tool_max_workers = 32
+        self.answer_max_concurrency = 5
+        self.llm_cache_path = None
+        self.llm_cache_mode = "off"
+        self.llm_cache_max_mb = 1024
         self.temperature = 1.0
         self.max_tokens_num = 4096
         self.lang_aware = False
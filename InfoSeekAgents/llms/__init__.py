@@ -1,9 +1,97 @@
 from __future__ import annotations
+import asyncio
+import os
+import threading
 import time
 import traceback
+import weakref
 
 from ..config import CFG
 from ..llms.clients import RemoteClient, FastChatClient
+from ..llms.cache import get_llm_cache, get_cache_key, lookup_response
+from ..utils.async_utils import add_shutdown_hook
+
+
+_CLIENTS = dict()
+_CLIENT_STATS = dict()
+_CLIENTS_LOCK = threading.Lock()
+_PROVIDER_SEMAPHORES = weakref.WeakKeyDictionary()
+
+
+def get_client_key(llm_model_name: str) -> tuple[str, str, str]:
+    """Returns the (api_type, base_url, model) key of the client serving `llm_model_name`"""
+    model = llm_model_name.lower()
+    if CFG.use_local_llm:
+        return "fastchat", f"http://{CFG.local_llm_host}:{CFG.local_llm_port}", model
+    return os.environ.get("API_TYPE", "open_ai"), os.environ.get("API_BASE", ""), model
+
+
+def get_llm_client(llm_model_name: str):
+    """Returns the process-wide client of `llm_model_name`, creating it on first use
+
+    Clients keep their HTTP connection pool alive, so planning, summarization, ranking,
+    answer and judge calls to the same endpoint reuse keep-alive connections.
+    """
+    key = get_client_key(llm_model_name)
+    with _CLIENTS_LOCK:
+        llm_bot = _CLIENTS.get(key)
+        if llm_bot is None:
+            api_type, _, model = key
+            if api_type == "fastchat":
+                llm_bot = FastChatClient(model, host=CFG.local_llm_host, port=CFG.local_llm_port)
+            else:
+                llm_bot = RemoteClient(model)
+            _CLIENTS[key] = llm_bot
+            _CLIENT_STATS[key] = {"created": 1, "requests": 0}
+        _CLIENT_STATS[key]["requests"] += 1
+    return llm_bot
+
+
+def get_client_stats() -> dict:
+    """Returns per-client usage of this process, `client_reused` counts requests served by an existing client,
+    `rate_limited` the calls that failed with a rate limit error
+
+    Whether their connections are kept alive is reported per host by `get_http_stats`.
+    """
+    with _CLIENTS_LOCK:
+        return {
+            "/".join(key): dict(stats, client_reused=stats["requests"] - stats["created"],
+                                rate_limited=getattr(_CLIENTS[key], "rate_limited", 0))
+            for key, stats in _CLIENT_STATS.items()
+        }
+
+
+def get_provider_semaphore(llm_model_name: str) -> asyncio.Semaphore:
+    """Returns the semaphore bounding concurrent requests to the provider of `llm_model_name`
+
+    Semaphores are kept per event loop and per (api_type, base_url), so all models served
+    by the same endpoint share the `CFG.llm_max_concurrency` budget.
+    """
+    loop = asyncio.get_running_loop()
+    semaphores = _PROVIDER_SEMAPHORES.setdefault(loop, dict())
+    provider = get_client_key(llm_model_name)[:2]
+    if provider not in semaphores:
+        semaphores[provider] = asyncio.Semaphore(CFG.llm_max_concurrency)
+    return semaphores[provider]
+
+
+async def aclose_llm_clients():
+    """Closes the async clients bound to the running event loop, before the loop is closed"""
+    with _CLIENTS_LOCK:
+        clients = list(_CLIENTS.values())
+    for llm_bot in clients:
+        if isinstance(llm_bot, RemoteClient):
+            await llm_bot.aclose()
+
+
+add_shutdown_hook(aclose_llm_clients)
+
+
+def clear_llm_clients():
+    """Drops all pooled clients, e.g. after changing API_TYPE or API_BASE"""
+    with _CLIENTS_LOCK:
+        _CLIENTS.clear()
+        _CLIENT_STATS.clear()
 
 
 def create_chat_completion(
@@ -16,10 +104,13 @@ def create_chat_completion(
     stop: str = "",
     chat_id: str = None
 ) -> tuple[str, list[tuple[str, str]]]:
-    if CFG.use_local_llm:
-        llm_bot = FastChatClient(llm_model_name.lower(), host=CFG.local_llm_host, port=CFG.local_llm_port)
-    else:
-        llm_bot = RemoteClient(llm_model_name.lower())
+    cache = get_llm_cache()
+    if cache is not None:
+        cache_key = get_cache_key(llm_model_name, system, history, query, temperature)
+        response = lookup_response(cache, cache_key)
+        if response is not None:
+            return response, history[:] + [[query, response]]
+    llm_bot = get_llm_client(llm_model_name)
     response = None
     num_retries = CFG.llm_max_retries
     for attempt in range(num_retries):
@@ -42,5 +133,55 @@ def create_chat_completion(
         time.sleep(backoff)
     if not response:
         raise RuntimeError(f"Failed to get response after {num_retries} retries")
+    if cache is not None:
+        cache.set(cache_key, response)
+
+    return response, new_history
+
+
+async def acreate_chat_completion(
+    query: str,
+    history: list[tuple[str, str]] = list(),
+    system: str = "",
+    llm_model_name: str = "gpt-3.5-turbo",
+    temperature: float = CFG.temperature,
+    max_tokens: int = None,
+    stop: str = "",
+    chat_id: str = None
+) -> tuple[str, list[tuple[str, str]]]:
+    """Async variant of `create_chat_completion`, bounded by the provider semaphore"""
+    cache = get_llm_cache()
+    if cache is not None:
+        cache_key = get_cache_key(llm_model_name, system, history, query, temperature)
+        response = lookup_response(cache, cache_key)
+        if response is not None:
+            return response, history[:] + [[query, response]]
+    llm_bot = get_llm_client(llm_model_name)
+    semaphore = get_provider_semaphore(llm_model_name)
+    response = None
+    num_retries = CFG.llm_max_retries
+    for attempt in range(num_retries):
+        backoff = 2 ** (attempt + 2)
+        try:
+            async with semaphore:
+                response, new_history = await llm_bot.achat(
+                    query=query,
+                    history=history,
+                    system=system,
+                    temperature=temperature,
+                    stop=stop,
+                    chat_id=chat_id
+                )
+            if response and "omitted content" not in response.lower():
+                break
+            else:
+                raise RuntimeError("GPT Chat return empty string, Retrying...")
+        except Exception as err:
+            print(err)
+        await asyncio.sleep(backoff)
+    if not response:
+        raise RuntimeError(f"Failed to get response after {num_retries} retries")
+    if cache is not None:
+        cache.set(cache_key, response)
 
-    return response, new_history
\ No newline at end of file
+    return response, new_history
@@ -0,0 +1,62 @@
+"""Content-addressed cache of chat completions, shared by all worker processes of a run"""
+from __future__ import annotations
+import hashlib
+import json
+import threading
+
+from ..config import CFG
+from ..utils.cache_utils import SQLiteCache
+
+
+LLM_CACHE_MODES = ("off", "readwrite", "readonly", "replay")
+
+_CACHES = dict()
+_CACHES_LOCK = threading.Lock()
+
+
+class ReplayMissError(RuntimeError):
+    """A prompt is not in the cache while replaying a run"""
+
+
+def get_llm_cache() -> SQLiteCache | None:
+    """Returns the response cache configured by `CFG.llm_cache_path` and `CFG.llm_cache_mode`
+
+    Modes:
+        off: no cache
+        readwrite: serve hits, store the responses of misses
+        readonly: serve hits, misses call the API but are not stored
+        replay: serve hits, misses raise `ReplayMissError` so a replayed run never calls the API
+    """
+    if CFG.llm_cache_mode == "off" or not CFG.llm_cache_path:
+        return None
+    key = (CFG.llm_cache_path, CFG.llm_cache_mode)
+    if key not in _CACHES:
+        with _CACHES_LOCK:
+            if key not in _CACHES:
+                _CACHES[key] = SQLiteCache(
+                    CFG.llm_cache_path,
+                    max_bytes=int(CFG.llm_cache_max_mb * 2 ** 20),
+                    readonly=CFG.llm_cache_mode != "readwrite"
+                )
+    return _CACHES[key]
+
+
+def get_cache_key(model: str, system: str, history: list, query, temperature: float) -> str:
+    """The sha256 of everything that determines a completion"""
+    content = json.dumps([model.lower(), system, history, query, temperature], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def lookup_response(cache: SQLiteCache, key: str) -> str | None:
+    """Returns the cached response of `key` and counts the hit or miss"""
+    response = cache.get(key)
+    cache.incr("hits" if response is not None else "misses")
+    if response is None and CFG.llm_cache_mode == "replay":
+        raise ReplayMissError(f"Response {key} is not in the cache {CFG.llm_cache_path}")
+    return response
+
+
+def get_llm_cache_counters() -> dict:
+    """Snapshot of the cumulative hit/miss counters of the cache, empty when it is off"""
+    cache = get_llm_cache()
+    return cache.counters() if cache is not None else dict()
@@ -1,11 +1,15 @@
+import asyncio
 import os
-import requests
+import threading
+import weakref
 import traceback
 import openai
 import google.generativeai as genai
 from google.generativeai.types import RequestOptions
 from google.api_core import retry
 
+from ..utils.http_utils import new_session, httpx_client_kwargs
+
 
 def get_qwen_response(client, model, msgs, temperature):
     reasoning_content = ""
@@ -37,6 +41,30 @@ def get_qwen_response(client, model, msgs, temperature):
     return content
 
 
+async def aget_qwen_response(client, model, msgs, temperature):
+    reasoning_content = ""
+    content = ""
+
+    completion = await client.chat.completions.create(
+        model=model,
+        messages=msgs,
+        stream=True,
+        temperature=temperature,
+    )
+    async for chunk in completion:
+        if not chunk.choices:
+            print("\nUsage:")
+            print(chunk.usage)
+        else:
+            delta = chunk.choices[0].delta
+            # omit reasoning content
+            if hasattr(delta, 'reasoning_content') and delta.reasoning_content is not None:
+                reasoning_content += delta.reasoning_content
+            else:
+                content += delta.content
+    return content
+
+
 def make_gpt_messages(query, system, history):
     msgs = list()
     if system:
@@ -64,20 +92,80 @@ class RemoteClient(object):
     def __init__(self, model="gpt-4o-mini"):
         self.model = model
         self.api_type = os.environ.get("API_TYPE", "open_ai")
+        self.api_base = os.environ.get("API_BASE")
         self.api_key = os.environ["API_KEY"]
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.rate_limited = 0
+
+    @property
+    def client(self):
+        """The long-lived SDK client, created on first use so its connection pool is kept across calls"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._make_client()
+        return self._client
+
+    @property
+    def async_client(self):
+        """The async SDK client of the running event loop, its connections cannot be shared across loops"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._make_async_client()
+            self._async_clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """Closes the async SDK client of the running event loop and its connections"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def _make_async_client(self):
+        http_client = openai.DefaultAsyncHttpxClient(**httpx_client_kwargs(is_async=True))
+        if self.api_type == "azure":
+            return openai.AsyncAzureOpenAI(
+                api_key=self.api_key,
+                api_version=os.environ.get("API_VERSION"),
+                azure_endpoint=self.api_base,
+                http_client=http_client
+            )
+        elif self.api_type == "open_ai":
+            return openai.AsyncOpenAI(api_key=self.api_key, http_client=http_client)
+        else:  # deepseek
+            return openai.AsyncOpenAI(api_key=self.api_key, base_url=self.api_base, http_client=http_client)
+
+    def _make_client(self):
+        if self.api_type == 'google':
+            genai.configure(api_key=self.api_key)
+            return genai.GenerativeModel(self.model)
+        http_client = openai.DefaultHttpxClient(**httpx_client_kwargs())
+        if self.api_type == "azure":
+            return openai.AzureOpenAI(
+                api_key=self.api_key,
+                api_version=os.environ.get("API_VERSION"),
+                azure_endpoint=self.api_base,
+                http_client=http_client
+            )
+        elif self.api_type == "open_ai":
+            return openai.OpenAI(api_key=self.api_key, http_client=http_client)
+        else:  # deepseek
+            return openai.OpenAI(api_key=self.api_key, base_url=self.api_base, http_client=http_client)
 
     def chat(self, query, history=list(), system="", temperature=0.0, enable_thinking=False, stop="", *args, **kwargs):
         if self.api_type == 'google':
             try:
-                genai.configure(api_key=self.api_key)
-                model = genai.GenerativeModel(self.model)
-                response = model.generate_content(query,
-                                                  request_options=RequestOptions(retry=retry.Retry(initial=10, multiplier=2, maximum=60, timeout=300)))
+                response = self.client.generate_content(query,
+                                                        request_options=RequestOptions(retry=retry.Retry(initial=10, multiplier=2, maximum=60, timeout=300)))
                 response_text = response.text
             except:
                 # print('current query', query)
                 print(traceback.format_exc())
                 if 'rate-limits' in traceback.format_exc():
+                    self._count_rate_limited()
                     exit()
                 response_text = ""
                 if "content_filter" in traceback.format_exc():
@@ -85,21 +173,10 @@ class RemoteClient(object):
         else:
             msgs = make_gpt_messages(query, system, history)
             try:
-                if self.api_type == "azure":
-                    client = openai.AzureOpenAI(
-                        api_key=self.api_key,
-                        api_version=os.environ.get("API_VERSION"),
-                        azure_endpoint=os.environ.get("API_BASE")
-                    )
-                elif self.api_type == "open_ai":
-                    client = openai.OpenAI(api_key=self.api_key)
-                else:  # deepseek
-                    client = openai.OpenAI(api_key=self.api_key, base_url=os.environ.get("API_BASE"))
-
                 if self.api_type == "qwen":
-                    response_text = get_qwen_response(client, self.model, msgs, temperature)
+                    response_text = get_qwen_response(self.client, self.model, msgs, temperature)
                 else:
-                    response = client.chat.completions.create(
+                    response = self.client.chat.completions.create(
                         model=self.model,
                         messages=msgs,
                         temperature=temperature,
@@ -108,21 +185,55 @@ class RemoteClient(object):
                     response_text = response.choices[0].message.content
             except:
                 # print('current query', query)
-                err = traceback.format_exc()
-                print(err)
-                response_text = ""
-                if "content_filter" in err or "inappropriate content" in err or 'Content Exists Risk' in err:
-                    response_text = '[]'
+                response_text = self._handle_error(traceback.format_exc())
+
+        new_history = history[:] + [[query, response_text]]
+        return response_text, new_history
+
+    async def achat(self, query, history=list(), system="", temperature=0.0, enable_thinking=False, stop="", *args, **kwargs):
+        if self.api_type == 'google':
+            # the gemini SDK has no loop-independent async client, run the pooled sync one in a thread
+            return await asyncio.to_thread(self.chat, query, history=history, system=system,
+                                           temperature=temperature, stop=stop)
+        msgs = make_gpt_messages(query, system, history)
+        try:
+            if self.api_type == "qwen":
+                response_text = await aget_qwen_response(self.async_client, self.model, msgs, temperature)
+            else:
+                response = await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=msgs,
+                    temperature=temperature,
+                    stream=False
+                )
+                response_text = response.choices[0].message.content
+        except:
+            response_text = self._handle_error(traceback.format_exc())
 
         new_history = history[:] + [[query, response_text]]
         return response_text, new_history
 
+    def _count_rate_limited(self):
+        with self._lock:
+            self.rate_limited += 1
+
+    def _handle_error(self, err):
+        print(err)
+        if "RateLimitError" in err:
+            # the SDK has already retried the 429s, this call failed
+            self._count_rate_limited()
+        response_text = ""
+        if "content_filter" in err or "inappropriate content" in err or 'Content Exists Risk' in err:
+            response_text = '[]'
+        return response_text
+
 
 class FastChatClient(object):
     def __init__(self, model="llama3.3-8b", host="localhost", port=8888):
         self.model = model
         self.host = host
         self.port = port
+        self.session = new_session()
 
     def chat(self, query, history=list(), system="", temperature=0.0, stop="", *args, **kwargs):
         url = f'http://{self.host}:{self.port}/v1/completions/'
@@ -142,13 +253,17 @@ class FastChatClient(object):
             "top_k": 40,
             "max_tokens": 512
         }
-        resp = requests.post(url=url, json=data, headers=headers)
+        resp = self.session.post(url=url, json=data, headers=headers)
         response = resp.json() # Check the JSON Response Content documentation below
         response_text = response['choices'][0]['text']
 
         new_history = history[:] + [[query, response_text]]
         return response_text, new_history
 
+    async def achat(self, query, history=list(), system="", temperature=0.0, stop="", *args, **kwargs):
+        return await asyncio.to_thread(self.chat, query, history=history, system=system,
+                                       temperature=temperature, stop=stop)
+
     @staticmethod
     def make_prompt(query, system, history):
         if not history:
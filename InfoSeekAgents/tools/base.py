@@ -1,4 +1,25 @@
+import asyncio
+import functools
 import pprint
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from InfoSeekAgents.config import CFG
+
+
+_TOOL_EXECUTOR = None
+_TOOL_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_tool_executor():
+    """The thread pool blocking tools run on when called from an event loop"""
+    global _TOOL_EXECUTOR
+    if _TOOL_EXECUTOR is None:
+        with _TOOL_EXECUTOR_LOCK:
+            if _TOOL_EXECUTOR is None:
+                _TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=CFG.tool_max_workers,
+                                                    thread_name_prefix="tool")
+    return _TOOL_EXECUTOR
 
 
 class BaseResult(object):
@@ -30,4 +51,9 @@ class BaseTool(object):
         pass
 
     def __call__(self):
-        return BaseResult({})
\ No newline at end of file
+        return BaseResult({})
+
+    async def acall(self, *args, **kwargs):
+        """Async variant of `__call__`, runs the blocking tool on the tool thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_tool_executor(), functools.partial(self.__call__, *args, **kwargs))
@@ -1,16 +1,17 @@
 from __future__ import annotations
 import logging
 import os.path
+import time
 from pathlib import Path
 
-from bs4 import BeautifulSoup
 from selenium.webdriver.remote.webdriver import WebDriver
 
-from InfoSeekAgents.utils.html_utils import extract_hyperlinks, format_hyperlinks
+from InfoSeekAgents.utils.html_utils import parse_page, format_hyperlinks
 import InfoSeekAgents.utils.nlp_utils as summary
 from InfoSeekAgents.config import Config
 from InfoSeekAgents.tools.base import BaseTool, BaseResult
-from InfoSeekAgents.utils.selenium_utils import get_pagesource_with_selenium
+from InfoSeekAgents.utils.fetch_utils import fetch_page, revalidate_page
+from InfoSeekAgents.utils.page_cache import get_page_cache, get_page_key, count
 
 FILE_DIR = Path(__file__).parent.parent
 
@@ -54,7 +55,7 @@ class BrowserTool(BaseTool):
         })
 
 
-def browse_website(url: str, question: str, cfg: Config = None) -> tuple[str, WebDriver]:
+def browse_website(url: str, question: str, cfg: Config = None) -> tuple[str, list[str], list]:
     """Browse a website and return the answer and links to the user
 
     Args:
@@ -62,62 +63,57 @@ def browse_website(url: str, question: str, cfg: Config = None) -> tuple[str, We
         question (str): The question asked by the user
 
     Returns:
-        Tuple[str, WebDriver]: The answer and links to the user and the webdriver
+        Tuple[str, List[str], List]: The answer, links and the prompt/responses of the summary
     """
     if cfg:
         cfg.chain_logger.put("click", f"Access the website {url} ")
-    driver, text = scrape_text_with_selenium(url, cfg)
-    # add_header(driver)
-    summary_text, prompt_responses = summary.summarize_text(url, text, question, driver, cfg)
-    links = scrape_links_with_selenium(driver, url)
+    text, links = scrape_page(url, cfg)
+    summary_text, prompt_responses = summary.summarize_text(url, text, question, None, cfg)
 
     # Limit links to 5
     if len(links) > 5:
         links = links[:5]
-    close_browser(driver)
     return summary_text, links, prompt_responses
 
-def scrape_text_with_selenium(url: str, cfg: Config = None) -> tuple[WebDriver, str]:
-    """Scrape text from a website using selenium
+def scrape_page(url: str, cfg: Config = None) -> tuple[str, list[str]]:
+    """Scrape text and links from a website, over plain HTTP when possible and with selenium otherwise
 
-    Args:
-        url (str): The url of the website to scrape
-
-    Returns:
-        Tuple[WebDriver, str]: The webdriver and the text scraped from the website
-    """
-    driver, page_source = get_pagesource_with_selenium(url, cfg.selenium_web_browser)
-    soup = BeautifulSoup(page_source, "html.parser")
-    for script in soup(["script", "style"]):
-        script.extract()
-
-    text = soup.get_text()
-    lines = (line.strip() for line in text.splitlines())
-    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-    text = "\n".join(chunk for chunk in chunks if chunk)
-    return driver, text
-
-
-def scrape_links_with_selenium(driver: WebDriver, url: str) -> list[str]:
-    """Scrape links from a website using selenium
+    With `cfg.page_cache_path` set, pages younger than `cfg.page_cache_ttl` are served from the
+    page cache, and older ones are reused when the server answers a conditional GET with a 304, and replaced by
+    the page it answers with otherwise.
 
     Args:
-        driver (WebDriver): The webdriver to use to scrape the links
+        url (str): The url of the website to scrape
 
     Returns:
-        List[str]: The links scraped from the website
+        Tuple[str, List[str]]: The text and the links scraped from the website
     """
-    if not driver:
-        return list()
-    page_source = driver.page_source
-    soup = BeautifulSoup(page_source, "html.parser")
-
-    for script in soup(["script", "style"]):
-        script.extract()
-
-    hyperlinks = extract_hyperlinks(soup, url)
-
-    return format_hyperlinks(hyperlinks)
+    cfg = cfg if cfg else Config()
+    cache = get_page_cache(cfg)
+    response = None
+    if cache is not None:
+        key = get_page_key(url)
+        entry = cache.get_entry(key)
+        if entry is not None:
+            page, created = entry
+            if time.time() - created < cfg.page_cache_ttl:
+                count(cache, "page_hits")
+                return page["text"], page["links"]
+            not_modified, response = revalidate_page(url, page["validators"], cfg.browse_http_timeout)
+            if not_modified:
+                count(cache, "page_revalidated")
+                cache.set(key, page)
+                return page["text"], page["links"]
+        count(cache, "page_misses")
+
+    page_source, validators = fetch_page(url, cfg.selenium_web_browser, http_first=cfg.browse_http_first,
+                                         timeout=cfg.browse_http_timeout, min_text_length=cfg.browse_min_text_length,
+                                         response=response)
+    text, hyperlinks = parse_page(page_source, url)
+    links = format_hyperlinks(hyperlinks)
+    if cache is not None and text:
+        cache.set(key, {"text": text, "links": links, "validators": validators})
+    return text, links
 
 
 def close_browser(driver: WebDriver) -> None:
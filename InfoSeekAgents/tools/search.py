@@ -1,18 +1,49 @@
+import asyncio
+from collections import Counter
 from itertools import islice
 import json
 import os
-import random
+import threading
 import traceback
-import time
-import requests
 from bs4 import BeautifulSoup as soup
 from duckduckgo_search import DDGS
 from serpapi import GoogleSearch
 
-from InfoSeekAgents.tools.base import BaseResult, BaseTool
+from InfoSeekAgents.tools.base import BaseResult, BaseTool, get_tool_executor
+from InfoSeekAgents.tools.search_cache import get_search_cache, get_cache_key, acached_search
+from InfoSeekAgents.utils.async_utils import run_sync
+from InfoSeekAgents.utils.http_utils import get_session, new_session
+from InfoSeekAgents.utils.rate_limit import get_rate_limiter
+from InfoSeekAgents.utils.retry_utils import ProviderBannedError, RetryPolicy, get_circuit_breaker
 from InfoSeekAgents.utils.selenium_utils import get_pagesource_with_selenium
 from InfoSeekAgents.config import Config
 from InfoSeekAgents.tools.search_engines import Google, Bing, Yahoo
+from InfoSeekAgents.tools.search_engines.http_client import set_session_factory
+
+
+# the search crawlers share the connection pools and per-host metrics of the other tools
+set_session_factory(new_session)
+
+# the environment variables an API provider needs, it is skipped without them
+API_PROVIDER_KEYS = {
+    "google_api": ["SERPER_API_KEY"],
+    "bing_api": ["SERP_API_KEY"],
+    "yahoo_api": ["SERP_API_KEY"],
+}
+
+_HEDGE_LOCK = threading.Lock()
+HEDGE_STATS = Counter()
+
+
+def count_hedge(name: str) -> None:
+    with _HEDGE_LOCK:
+        HEDGE_STATS[name] += 1
+
+
+def get_hedge_stats() -> dict:
+    """Returns how many backup providers hedged searches launched, and which provider won each search"""
+    with _HEDGE_LOCK:
+        return {"hedge": dict(HEDGE_STATS)}
 
 
 class SearchResult(BaseResult):
@@ -62,23 +93,12 @@ class SearchTool(BaseTool):
         self.max_search_nums = max_search_nums
         self.max_retry_times = max_retry_times
         self.lang = lang
-        self.driver = None
-        self.driver_cnt = 0
         self.search_type = cfg.search_type
         print(f'--------------Search Type:{self.search_type}---------------')
 
-    def set_driver(self, driver):
-        self.driver_cnt += 1
-        if self.driver_cnt >= 20:
-            self.driver_cnt = 0
-            self.driver = None
-        else:
-            self.driver = driver
-            
     def get_results_by_selenium(self, keyword):
         url = f"https://duckduckgo.com/?q={keyword}&t=h_&ia=web"
-        driver, page_source = get_pagesource_with_selenium(url, "chrome", self.driver)
-        self.set_driver(driver)
+        page_source = get_pagesource_with_selenium(url, "chrome")
         page_soup = soup(page_source, "html.parser")
         articles = page_soup.find_all("article")
 
@@ -97,20 +117,24 @@ class SearchTool(BaseTool):
         print('Searching DuckDuckGo by crawler')
         return results
 
-    def get_search_results_by_crawler(self, keyword):
-        if self.search_type.lower() == 'ddg':
+    def get_search_results_by_crawler(self, keyword, search_type=None):
+        search_type = (search_type or self.search_type).lower()
+        if search_type == 'ddg':
             return self.get_results_by_selenium(keyword)
         proxy = os.environ.get('http_proxy')
-        if self.search_type.lower() == 'google':
+        if search_type == 'google':
             search_engine = Google(proxy=proxy)
-        elif self.search_type.lower() == 'bing':
+        elif search_type == 'bing':
             search_engine = Bing(proxy=proxy)
-        elif self.search_type.lower() == 'yahoo':
+        elif search_type == 'yahoo':
             search_engine = Yahoo(proxy=proxy)
         else:
             raise NotImplementedError
-        search_results = search_engine.search(keyword, pages=1)
-        time.sleep(random.uniform(4, 6))  # 适当延时，避免请求过快
+        search_engine.prefetch = self.cfg.search_prefetch
+        search_results = search_engine.search(keyword, pages=self.cfg.search_crawler_pages,
+                                              max_results=self.max_search_nums)
+        if search_engine.is_banned:
+            raise ProviderBannedError(f"{search_type} refused the crawler")
 
         results = list()
         for idx in range(len(search_results)):
@@ -189,7 +213,9 @@ class SearchTool(BaseTool):
             'X-API-KEY': serper_key,
             'Content-Type': 'application/json'
         }
-        response = requests.request("POST", url, headers=headers, data=payload)
+        response = get_session().post(url, headers=headers, data=payload)
+        if response.status_code in [403, 429, 503]:
+            raise ProviderBannedError(f"serper returned HTTP {response.status_code}")
         search_results = list()
         for res in json.loads(response.text)["organic"]:
             search_results.append({
@@ -211,7 +237,10 @@ class SearchTool(BaseTool):
             "q": keyword
         }
         url = "https://www.googleapis.com/customsearch/v1"
-        results = requests.get(url, params=data).json()
+        response = get_session().get(url, params=data)
+        if response.status_code in [403, 429, 503]:
+            raise ProviderBannedError(f"google custom search returned HTTP {response.status_code}")
+        results = response.json()
         results = results.get("items", [])
         search_results = list()
         for result in results:
@@ -222,14 +251,15 @@ class SearchTool(BaseTool):
             })
         return search_results
 
-    def get_results_by_api(self, keyword):
-        if self.search_type.lower() == 'ddg':
+    def get_results_by_api(self, keyword, search_type=None):
+        search_type = (search_type or self.search_type).lower()
+        if search_type == 'ddg':
             results = self.get_results_by_ddg(keyword)
-        elif self.search_type.lower() == 'google':
+        elif search_type == 'google':
             results = self.get_results_by_google_serper(keyword)
-        elif self.search_type.lower() == 'bing':
+        elif search_type == 'bing':
             results = self.get_results_by_bing_serp(keyword)
-        elif self.search_type.lower() == 'yahoo':
+        elif search_type == 'yahoo':
             results = self.get_results_by_yahoo_serp(keyword)
         else:
             results = None
@@ -238,41 +268,166 @@ class SearchTool(BaseTool):
         else:
             return results, True
 
-    def _retry_search_result(self, keyword, counter=0):
-        counter += 1
-        if counter > self.max_retry_times:
-            print("Search failed after %d retrying" % counter, ', return search failed')
-            return [{
-                "title": "Search Failed",
-                "href": "",
-                "body": ""
-            }]
+    def _call_provider(self, breaker, provider, keyword):
+        """Calls a provider its circuit breaker let through, records the outcome and returns the results
+
+        Only exceptions and bans count as failures of the provider; a search answered with no
+        results is a success.
+        """
+        search_type, tier = provider.rsplit("_", 1)
         try:
-            search_results = None
-            error_message = ''
-            try:
-                search_results, use_selenium = self.get_results_by_api(keyword)
-            except:
-                error_message = traceback.format_exc()
-                print(error_message)
-                use_selenium = True
-            if not search_results and (counter >= 2 or 'Ratelimit' in error_message):
-                use_selenium = True
-            if use_selenium:
-                search_results = self.get_search_results_by_crawler(keyword)
-            if search_results and (
-                    "Google Patents" in search_results[0]["body"] or "patent" in search_results[0]["href"]):
-                search_results = list()
-            if not search_results:
-                time.sleep(random.uniform(1, 5))  # 适当延时，避免请求过快
-                return self._retry_search_result(keyword, counter)
-            print('Num of search results', len(search_results))
-            return search_results
-        except:
+            if tier == "api":
+                search_results, _ = self.get_results_by_api(keyword, search_type)
+            else:
+                search_results = self.get_search_results_by_crawler(keyword, search_type)
+        except Exception as err:
             print(traceback.format_exc())
-            print("Retry search...")
-            time.sleep(random.uniform(1, 5))  # 适当延时，避免请求过快
-            return self._retry_search_result(keyword, counter)
+            breaker.record_failure(banned=isinstance(err, ProviderBannedError) or "Ratelimit" in repr(err))
+            return list()
+        breaker.record_success()
+        if not search_results:
+            return list()
+        if "Google Patents" in search_results[0]["body"] or "patent" in search_results[0]["href"]:
+            return list()
+        return search_results
+
+    async def asearch_provider(self, provider, keyword):
+        """Searches `keyword` with one provider, unless it is not configured or its circuit breaker is open
+
+        The wait for the rate limiter of the provider is spent on the event loop, only the search
+        itself runs on the tool thread pool.
+
+        Args:
+            provider (str): "<search_type>_api" or "<search_type>_crawler", e.g. "bing_api"
+            keyword (str): Search query
+
+        Returns:
+            Tuple[List[dict], bool]: The results, empty when the search failed, and whether the provider was called
+        """
+        if not all(os.environ.get(name) for name in API_PROVIDER_KEYS.get(provider, [])):
+            return list(), False
+        breaker = get_circuit_breaker(provider, self.cfg)
+        if not breaker.allow():
+            return list(), False
+        try:
+            limiter = get_rate_limiter(provider, self.cfg)
+            if limiter is not None:
+                await limiter.aacquire()
+        except BaseException:
+            breaker.release()
+            raise
+        loop = asyncio.get_running_loop()
+        search_results = await loop.run_in_executor(get_tool_executor(), self._call_provider, breaker, provider,
+                                                    keyword)
+        return search_results, True
+
+    async def ahedged_search(self, keyword, providers):
+        """Fires the first provider, and the next one whenever no result arrived within `cfg.search_hedge_delay`
+
+        A provider that fails launches the next one at once. The first non-empty result wins and
+        the results of the providers still running are ignored. After `cfg.search_hedge_timeout`
+        seconds, no provider is launched any more and the ones still running are abandoned.
+
+        Returns:
+            Tuple[List[dict], bool]: The results, empty when all providers failed, and whether any provider was called
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.cfg.search_hedge_timeout
+        remaining = list(providers)
+        tasks = dict()
+        pending = set()
+        called = False
+        while remaining or pending:
+            if remaining:
+                provider = remaining.pop(0)
+                task = asyncio.ensure_future(self.asearch_provider(provider, keyword))
+                tasks[task] = provider
+                pending.add(task)
+                if len(tasks) > 1:
+                    count_hedge("backups_launched")
+            timeout = max(0., deadline - loop.time())
+            if remaining:
+                timeout = min(timeout, self.cfg.search_hedge_delay)
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                search_results, provider_called = task.result()
+                called = called or provider_called
+                if search_results:
+                    for other in pending:
+                        other.cancel()
+                    count_hedge(f"won_by_{tasks[task]}")
+                    return search_results, True
+            if (remaining or pending) and loop.time() >= deadline:
+                # a provider still running was called, whether or not it ever answers
+                called = called or bool(pending)
+                for other in pending:
+                    other.cancel()
+                count_hedge("timed_out")
+                break
+        return list(), called
+
+    async def _aretry_search_result(self, keyword):
+        """Searches with the API tier, then the crawler tier, retrying with jittered exponential backoff
+
+        When `cfg.search_hedge_providers` lists providers for the search type, they are raced by
+        `ahedged_search` instead. Unconfigured providers and those whose circuit breaker is open are skipped, and the
+        search fails at once when no provider is available.
+        """
+        search_type = self.search_type.lower()
+        hedge_providers = self.cfg.search_hedge_providers.get(search_type) if self.cfg.hedge_search else None
+        policy = RetryPolicy(self.max_retry_times, self.cfg.search_retry_base, self.cfg.search_retry_cap)
+        for attempt in range(policy.max_attempts):
+            if attempt > 0:
+                print("Retry search...")
+                await policy.asleep(attempt - 1)
+            if hedge_providers:
+                search_results, called = await self.ahedged_search(keyword, hedge_providers)
+            else:
+                called = False
+                for provider in [f"{search_type}_api", f"{search_type}_crawler"]:
+                    search_results, provider_called = await self.asearch_provider(provider, keyword)
+                    called = called or provider_called
+                    if search_results:
+                        break
+            if search_results:
+                print('Num of search results', len(search_results))
+                return search_results
+            if not called:
+                print(f"All {self.search_type} providers are unconfigured or cooling down, return search failed")
+                break
+        else:
+            print("Search failed after %d retrying" % policy.max_attempts, ', return search failed')
+        return [{
+            "title": "Search Failed",
+            "href": "",
+            "body": ""
+        }]
+
+    def search(self, text):
+        """Searches `text` from a thread other than the event loop's, see `asearch`"""
+        return run_sync(self.asearch(text))
+
+    async def asearch(self, text):
+        """Searches `text`, through the search cache when `cfg.search_cache_path` is set"""
+        cache = get_search_cache(self.cfg)
+        if cache is None:
+            return await self._aretry_search_result(text)
+
+        async def asearch():
+            results = await self._aretry_search_result(text)
+            # failed searches are not cached
+            return None if results[0]["title"] == "Search Failed" else results
+
+        def search():
+            return run_sync(asearch())
+
+        key = get_cache_key(self.search_type, text, self.max_search_nums)
+        results = await acached_search(cache, key, asearch, search, self.cfg.search_cache_ttl,
+                                       self.cfg.search_cache_stale_ttl)
+        return results if results else [{"title": "Search Failed", "href": "", "body": ""}]
 
     def __call__(self, text):
-        return SearchResult(self._retry_search_result(text))
+        return SearchResult(self.search(text))
+
+    async def acall(self, text):
+        return SearchResult(await self.asearch(text))
@@ -0,0 +1,112 @@
+"""Persistent cache of web search results with a TTL and stale-while-revalidate"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import traceback
+from collections import Counter
+
+from InfoSeekAgents.utils.cache_utils import SQLiteCache
+
+
+_CACHES = dict()
+_CACHES_LOCK = threading.Lock()
+_REFRESHING = set()
+_REFRESHING_LOCK = threading.Lock()
+SEARCH_CACHE_STATS = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+def get_search_cache(cfg) -> SQLiteCache | None:
+    """Returns the search cache configured by `cfg.search_cache_path`, None when it is off"""
+    if not cfg.search_cache_path:
+        return None
+    if cfg.search_cache_path not in _CACHES:
+        with _CACHES_LOCK:
+            if cfg.search_cache_path not in _CACHES:
+                _CACHES[cfg.search_cache_path] = SQLiteCache(
+                    cfg.search_cache_path, max_bytes=int(cfg.search_cache_max_mb * 2 ** 20))
+    return _CACHES[cfg.search_cache_path]
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def get_cache_key(search_type: str, text: str, max_search_nums: int) -> str:
+    content = json.dumps([search_type.lower(), normalize_query(text), max_search_nums], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def count(cache: SQLiteCache, name: str) -> None:
+    with _STATS_LOCK:
+        SEARCH_CACHE_STATS[name] += 1
+    cache.incr(name)
+
+
+def get_search_cache_stats() -> dict:
+    """Returns the hits, stale hits, misses and background refreshes of this process"""
+    with _STATS_LOCK:
+        return {"lookups": dict(SEARCH_CACHE_STATS)}
+
+
+def _refresh(cache: SQLiteCache, key: str, search) -> None:
+    try:
+        results = search()
+        if results:
+            cache.set(key, results)
+            count(cache, "refreshed")
+    except Exception:
+        print(traceback.format_exc())
+    finally:
+        with _REFRESHING_LOCK:
+            _REFRESHING.discard(key)
+
+
+def lookup_search(cache: SQLiteCache, key: str, search, ttl: float, stale_ttl: float) -> list[dict] | None:
+    """Returns the cached results of a search while they are fresh or stale, None on a miss
+
+    Results older than `ttl` but younger than `ttl + stale_ttl` are returned at once,
+    and a background thread refreshes them with `search()` for the next lookup.
+    """
+    entry = cache.get_entry(key)
+    if entry is not None:
+        results, created = entry
+        age = time.time() - created
+        if age < ttl:
+            count(cache, "hits")
+            return results
+        if age < ttl + stale_ttl:
+            count(cache, "stale_hits")
+            with _REFRESHING_LOCK:
+                start = key not in _REFRESHING
+                _REFRESHING.add(key)
+            if start:
+                threading.Thread(target=_refresh, args=(cache, key, search), daemon=True).start()
+            return results
+    count(cache, "misses")
+    return None
+
+
+async def acached_search(cache: SQLiteCache, key: str, asearch, search, ttl: float, stale_ttl: float) -> list[dict]:
+    """Returns the results of `await asearch()`, served from `cache` while they are fresh
+
+    Args:
+        cache (SQLiteCache): The search cache
+        key (str): The cache key of the search
+        asearch (callable): Runs the search on the event loop, returns a list of results or None when it failed
+        search (callable): Runs the same search from a background thread, to refresh stale results
+        ttl (float): Seconds during which cached results are fresh
+        stale_ttl (float): Seconds after `ttl` during which stale results are still served, see `lookup_search`
+
+    Returns:
+        List[dict]: The search results
+    """
+    results = await asyncio.to_thread(lookup_search, cache, key, search, ttl, stale_ttl)
+    if results is None:
+        results = await asearch()
+        if results:
+            await asyncio.to_thread(cache.set, key, results)
+    return results
@@ -17,6 +17,13 @@ USER_AGENT = 'search_engines/0.5 Repo: https://github.com/tasos-py/Search-Engine
 ## Fake User-Agent string - Google desn't like the default user-agent
 FAKE_USER_AGENT = 'Mozilla/5.0 (Windows NT 6.1; rv:84.0) Gecko/20100101 Firefox/84.0'
 
+## HTML parser of the result pages: lxml is a fast C parser, html.parser the pure python fallback
+try:
+    import lxml
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 ## Proxy server 
 PROXY = None
 
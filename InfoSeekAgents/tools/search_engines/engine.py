@@ -1,5 +1,7 @@
 from bs4 import BeautifulSoup
-from time import sleep
+from time import sleep, time
+from threading import Event
+from concurrent.futures import ThreadPoolExecutor
 from random import uniform as random_uniform
 from collections import namedtuple
 
@@ -18,6 +20,7 @@ class SearchEngine(object):
         :param int timeout: optional, the HTTP timeout
         '''
         self._http_client = HttpClient(timeout, proxy) 
+        self._parser = cfg.HTML_PARSER
         self._delay = (1, 4)
         self._query = ''
         self._filters = []
@@ -30,11 +33,24 @@ class SearchEngine(object):
         '''Collects only unique domains.'''
         self.is_banned = False
         '''Indicates if a ban occured'''
+        self.deadline = None
+        '''Optional, the time after which no more pages are requested'''
+        self.prefetch = False
+        '''Fetches the next page while the current one is parsed, if its URL can be predicted'''
+        self._needs_delay = True
 
     def _selectors(self, element):
         '''Returns the appropriate CSS selector.'''
         raise NotImplementedError()
     
+    def _parse(self, html):
+        '''Parses a page with the parser backend of the engine.'''
+        return BeautifulSoup(html, self._parser)
+    
+    def set_parser(self, parser):
+        '''Sets the parser backend, any BeautifulSoup tree builder: 'lxml', 'html.parser', 'html5lib'.'''
+        self._parser = parser
+    
     def _first_page(self):
         '''Returns the initial page URL.'''
         raise NotImplementedError()
@@ -43,6 +59,10 @@ class SearchEngine(object):
         '''Returns the next page URL and post data.'''
         raise NotImplementedError()
     
+    def _page_url(self, page):
+        '''Returns the URL of a results page (1 is the first), None if it can't be predicted.'''
+        return None
+    
     def _get_url(self, tag, item='href'):
         '''Returns the URL of search results items.'''
         selector = self._selectors('url')
@@ -84,9 +104,13 @@ class SearchEngine(object):
         '''Checks if query is contained in the item.'''
         return self._query.lower() in item.lower()
     
+    def _result_tags(self, soup):
+        '''Returns the tags of the search results items.'''
+        return soup.select(self._selectors('links'))
+    
     def _filter_results(self, soup):
         '''Processes and filters the search results.''' 
-        tags = soup.select(self._selectors('links'))
+        tags = self._result_tags(soup)
         results = [self._item(l) for l in tags]
 
         if u'url' in self._filters:
@@ -106,9 +130,9 @@ class SearchEngine(object):
                 continue
             if item in self.results:
                 continue
-            if self.ignore_duplicate_urls and item['link'] in self.results.links():
+            if self.ignore_duplicate_urls and self.results.has_link(item['link']):
                 continue
-            if self.ignore_duplicate_domains and item['host'] in self.results.hosts():
+            if self.ignore_duplicate_domains and self.results.has_host(item['host']):
                 continue
             self.results.append(item)
 
@@ -149,24 +173,27 @@ class SearchEngine(object):
             else:
                 self._filters += [operator]
     
-    def search(self, query, pages=cfg.SEARCH_ENGINE_RESULTS_PAGES): 
+    def search(self, query, pages=cfg.SEARCH_ENGINE_RESULTS_PAGES, max_results=None): 
         '''Queries the search engine, goes through the pages and collects the results.
         
         :param query: str The search query  
         :param pages: int Optional, the maximum number of results pages to search  
+        :param max_results: int Optional, stops once this many unique results are collected  
         :returns SearchResults object
         '''
         out.console('Searching {} by crawler'.format(self.__class__.__name__))
         self._query = utils.decode_bytes(query)
         self.results = SearchResults()
         request = self._first_page()
+        if self.prefetch and pages > 1 and self._page_url(2):
+            return self._search_prefetch(request, pages, max_results)
 
         for page in range(1, pages + 1):
             try:
                 response = self._get_page(request['url'], request['data'])
                 if not self._is_ok(response):
                     break
-                tags = BeautifulSoup(response.html, "html.parser")
+                tags = self._parse(response.html)
                 items = self._filter_results(tags)
                 self._collect_results(items)
                 
@@ -176,13 +203,58 @@ class SearchEngine(object):
 
                 if not request['url']:
                     break
+                if max_results and len(self.results) >= max_results:
+                    break
                 if page < pages:
-                    sleep(random_uniform(*self._delay))
+                    delay = random_uniform(*self._delay)
+                    if self.deadline is not None and time() + delay >= self.deadline:
+                        break
+                    sleep(delay)
             except KeyboardInterrupt:
                 break
         out.console('', end='')
         return self.results
     
+    def _fetch_after_delay(self, url, cancelled):
+        '''Waits the politeness delay, if the engine needs one, then gets a page.'''
+        delay = random_uniform(*self._delay) if self._needs_delay else 0
+        if self.deadline is not None and time() + delay >= self.deadline:
+            return None
+        if cancelled.wait(delay):
+            return None
+        return self._get_page(url)
+    
+    def _search_prefetch(self, request, pages, max_results):
+        '''Goes through the pages, fetching page N+1 in the background while page N is parsed.'''
+        cancelled = Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self._get_page, request['url'], request['data'])
+        try:
+            for page in range(1, pages + 1):
+                response = future.result()
+                future = None
+                if response is None or not self._is_ok(response):
+                    break
+                if page < pages:
+                    future = executor.submit(self._fetch_after_delay, self._page_url(page + 1), cancelled)
+                tags = self._parse(response.html)
+                items = self._filter_results(tags)
+                self._collect_results(items)
+                
+                msg = 'page: {:<8} links: {}'.format(page, len(self.results))
+                out.console(msg, end='')
+                if not self._next_page(tags)['url']:
+                    break
+                if max_results and len(self.results) >= max_results:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False)
+        out.console('', end='')
+        return self.results
+    
     def output(self, output=out.PRINT, path=None):
         '''Prints search results and/or creates report files.
         Supported output format: html, csv, json.
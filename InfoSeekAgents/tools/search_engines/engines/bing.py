@@ -12,6 +12,7 @@ class Bing(SearchEngine):
         self._base_url = u'https://www.bing.com'
         # self._base_url = u'https://www4.bing.com'
         self.set_headers({'User-Agent':FAKE_USER_AGENT})
+        self._needs_delay = False
 
     def _selectors(self, element):
         '''Returns the appropriate CSS selector.'''
@@ -30,6 +31,10 @@ class Bing(SearchEngine):
         url = u'{}/search?q={}&search=&form=QBLH'.format(self._base_url, self._query)
         return {'url':url, 'data':None}
     
+    def _page_url(self, page):
+        '''Returns the URL of a results page, bing pages through with first='''
+        return u'{}/search?q={}&first={}&FORM=PERE'.format(self._base_url, self._query, (page - 1) * 10 + 1)
+    
     def _next_page(self, tags):
         '''Returns the next page URL and post data (if any)'''
         selector = self._selectors('next')
@@ -1,7 +1,6 @@
 from ..engine import SearchEngine
 from ..config import PROXY, TIMEOUT
 from ..utils import unquote_url, quote_url
-from bs4 import BeautifulSoup
 
 
 class Google(SearchEngine):
@@ -31,6 +30,10 @@ class Google(SearchEngine):
         self._check_consent(page)
         return {'url':url, 'data':None}
     
+    def _page_url(self, page):
+        '''Returns the URL of a results page, google pages through with start='''
+        return u'{}/search?q={}&start={}'.format(self._base_url, quote_url(self._query, ''), (page - 1) * 10)
+
     def _next_page(self, tags):
         '''Returns the next page URL and post data (if any)'''
         tags = tags.select('table a[href*="start="]')
@@ -62,15 +65,13 @@ class Google(SearchEngine):
     def _check_consent(self, page):
         '''Checks if cookies consent is required'''
         url = 'https://consent.google.com/save'
-        bs = BeautifulSoup(page.html, "html.parser")
+        bs = self._parse(page.html)
         consent_form = bs.select('form[action="{}"] input[name]'.format(url))
         if consent_form:
             data = {i['name']:i.get('value') for i in consent_form if i['name'] not in ['set_sc', 'set_aps']}
             page = self._get_page(url, data)
         return page
     
-    def _filter_results(self, soup):
-        '''Processes and filters the search results.''' 
-        tags = [i.find_parent('div').find_parent('div') for i in soup.select('div a[href^="/url?q="]')][:-1]
-        soup = BeautifulSoup(''.join('<item>' + str(i) + '</item>' for i in tags), "html.parser")
-        return super(Google, self)._filter_results(soup)
+    def _result_tags(self, soup):
+        '''Returns the tags of the search results items, selected in place without re-parsing them.'''
+        return [i.find_parent('div').find_parent('div') for i in soup.select('div a[href^="/url?q="]')][:-1]
@@ -1,5 +1,3 @@
-from bs4 import BeautifulSoup
-
 from search_engines.engine import SearchEngine
 from search_engines.config import PROXY, TIMEOUT, FAKE_USER_AGENT
 
@@ -26,7 +24,7 @@ class Metager(SearchEngine):
     def redirect(self, query):
         '''Redirects initial request to actual result page.'''
         response = self._get_page(query)
-        src_page = BeautifulSoup(response.html, "html.parser")
+        src_page = self._parse(response.html)
         url = src_page.select_one('iframe').get('src')
 
         return url
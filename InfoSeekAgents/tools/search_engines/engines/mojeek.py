@@ -25,6 +25,10 @@ class Mojeek(SearchEngine):
         url = u'{}/search?q={}'.format(self._base_url, self._query)
         return {'url':url, 'data':None}
     
+    def _page_url(self, page):
+        '''Returns the URL of a results page, mojeek pages through with s='''
+        return u'{}/search?q={}&s={}'.format(self._base_url, self._query, (page - 1) * 10 + 1)
+    
     def _next_page(self, tags):
         '''Returns the next page URL and post data (if any)'''
         selector = self._selectors('next')
@@ -1,5 +1,3 @@
-from bs4 import BeautifulSoup
-
 from ..engine import SearchEngine
 from ..config import PROXY, TIMEOUT, FAKE_USER_AGENT
 from .. import output as out
@@ -28,7 +26,7 @@ class Startpage(SearchEngine):
     def _first_page(self):
         '''Returns the initial page and query.'''
         response = self._get_page(self._base_url)
-        tags = BeautifulSoup(response.html, "html.parser")
+        tags = self._parse(response.html)
         selector = self._selectors('search_form')
 
         data = {
@@ -58,7 +56,7 @@ class Startpage(SearchEngine):
     
     def _is_ok(self, response):
         '''Checks if the HTTP response is 200 OK.'''
-        soup = BeautifulSoup(response.html, 'html.parser')
+        soup = self._parse(response.html)
         selector = self._selectors('blocked_form')
         is_blocked = soup.select_one(selector)
         
@@ -5,10 +5,19 @@ from .config import TIMEOUT, PROXY, USER_AGENT
 from . import utils as utl
 
 
+_session_factory = requests.session
+
+
+def set_session_factory(factory):
+    '''Sets the callable creating the session of every new HttpClient, e.g. one on shared connection pools.'''
+    global _session_factory
+    _session_factory = factory
+
+
 class HttpClient(object):
     '''Performs HTTP requests. A `requests` wrapper, essentialy'''
     def __init__(self, timeout=TIMEOUT, proxy=PROXY):
-        self.session = requests.session()
+        self.session = _session_factory()
         self.session.proxies = self._set_proxy(proxy)
         self.session.headers['User-Agent'] = USER_AGENT
         self.session.headers['Accept-Language'] = 'en-GB,en;q=0.5'
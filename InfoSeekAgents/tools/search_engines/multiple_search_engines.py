@@ -1,3 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from time import time
+
 from .results import SearchResults
 from .engines import search_engines_dict
 from . import output as out
@@ -6,7 +9,17 @@ from . import config as cfg
 
 class MultipleSearchEngines(object):
     '''Uses multiple search engines.'''
-    def __init__(self, engines, proxy=cfg.PROXY, timeout=cfg.TIMEOUT):
+    def __init__(self, engines, proxy=cfg.PROXY, timeout=cfg.TIMEOUT, max_workers=None, engine_timeout=None, 
+                 prefetch=False):
+        '''
+        :param list engines: the names of the search engines
+        :param str proxy: optional, a proxy server
+        :param int timeout: optional, the HTTP timeout
+        :param int max_workers: optional, the number of engines searched at once, default all of them
+        :param int engine_timeout: optional, the seconds after which an engine requests no more pages, 
+            and is dropped if it is still searching
+        :param bool prefetch: optional, whether the engines fetch the next page while parsing the current one
+        '''
         self._engines = [
             se(proxy, timeout) 
             for se in search_engines_dict.values() 
@@ -18,6 +31,11 @@ class MultipleSearchEngines(object):
         self.ignore_duplicate_domains = False
         self.results = SearchResults()
         self.banned_engines = []
+        self.timed_out_engines = []
+        self._started_at = {}
+        self.max_workers = max_workers
+        self.engine_timeout = engine_timeout
+        self.prefetch = prefetch
     
     def disable_console(self):
         '''Disables console output'''
@@ -27,32 +45,108 @@ class MultipleSearchEngines(object):
         '''Filters search results based on the operator.'''
         self._filter = operator
     
-    def search(self, query, pages=cfg.SEARCH_ENGINE_RESULTS_PAGES): 
-        '''Searches multiples engines and collects the results.'''
+    def _search_engine(self, engine, query, pages, max_results):
+        '''Searches one engine, in a worker thread.'''
+        engine.ignore_duplicate_urls = self.ignore_duplicate_urls
+        engine.ignore_duplicate_domains = self.ignore_duplicate_domains
+        if self._filter:
+            engine.set_search_operator(self._filter)
+        self._started_at[engine] = time()
+        engine.deadline = time() + self.engine_timeout if self.engine_timeout else None
+        engine.prefetch = self.prefetch
+        try:
+            return engine.search(query, pages, max_results)
+        except Exception as e:
+            out.console('{}: {}'.format(engine.__class__.__name__, e), level=out.Level.error)
+            return SearchResults()
+    
+    def _merge(self, engine, engine_results):
+        '''Adds the results of an engine that are not duplicates, returns them.'''
+        new_results = SearchResults()
+        for item in engine_results:
+            if self.ignore_duplicate_urls and self.results.has_link(item['link']):
+                continue
+            if self.ignore_duplicate_domains and self.results.has_host(item['host']):
+                continue
+            self.results.append(item)
+            new_results.append(item)
+
+        if engine.is_banned:
+            self.banned_engines.append(engine.__class__.__name__)
+        return new_results
+    
+    def search_iter(self, query, pages=cfg.SEARCH_ENGINE_RESULTS_PAGES, max_results=None):
+        '''Searches the engines concurrently, yields (engine, new results) as each engine finishes.
+        
+        Each engine stops paging once it has collected `max_results` results.
+        
+        Duplicates are removed against the results of the engines that finished earlier, 
+        so the merged results depend on the order the engines finish.
+        '''
+        self.results = SearchResults()
+        for engine, engine_results in self._search_all(query, pages, max_results):
+            yield engine, self._merge(engine, engine_results)
+    
+    def search(self, query, pages=cfg.SEARCH_ENGINE_RESULTS_PAGES, max_results=None): 
+        '''Searches multiples engines concurrently and collects the results.
+        
+        The results are merged in the order of the engines, as a sequential search would. 
+        Each engine stops paging once it has collected `max_results` results.
+        '''
+        finished = dict(
+            (engine, engine_results) for engine, engine_results in self._search_all(query, pages, max_results)
+        )
         self.results = SearchResults()
         for engine in self._engines:
-            engine.ignore_duplicate_urls = self.ignore_duplicate_urls
-            engine.ignore_duplicate_domains = self.ignore_duplicate_domains
-            if self._filter:
-                engine.set_search_operator(self._filter)
-            
-            engine_results = engine.search(query, pages)
-            if engine.ignore_duplicate_urls:
-                engine_results._results = [
-                    item for item in engine_results._results 
-                    if item['link'] not in self.results.links()
-                ]
-            if self.ignore_duplicate_domains:
-                engine_results._results = [
-                    item for item in engine_results._results 
-                    if item['host'] not in self.results.hosts()
-                ]
-            self.results._results += engine_results._results
-
-            if engine.is_banned:
-                self.banned_engines.append(engine.__class__.__name__)
+            if engine in finished:
+                self._merge(engine, finished[engine])
         return self.results
     
+    def _search_all(self, query, pages, max_results=None):
+        '''Searches the engines concurrently, yields (engine, all its results) as each engine finishes.
+        
+        An engine still searching `engine_timeout` seconds after it started is dropped, 
+        its thread is left to finish in the background and its results are ignored.
+        '''
+        self.timed_out_engines = []
+        self._started_at = {}
+        if not self._engines:
+            return
+        max_workers = self.max_workers or len(self._engines)
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search_engine')
+        try:
+            futures = {
+                executor.submit(self._search_engine, engine, query, pages, max_results): engine 
+                for engine in self._engines
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=self._next_timeout(futures, pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield futures[future], future.result()
+                for future in [f for f in pending if self._is_timed_out(futures[f])]:
+                    pending.discard(future)
+                    engine = futures[future]
+                    self.timed_out_engines.append(engine.__class__.__name__)
+                    out.console('{}: timed out after {}s'.format(engine.__class__.__name__, self.engine_timeout), level=out.Level.warning)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _is_timed_out(self, engine):
+        '''Whether an engine started searching more than `engine_timeout` seconds ago.'''
+        started_at = self._started_at.get(engine)
+        return bool(self.engine_timeout) and started_at is not None and time() - started_at >= self.engine_timeout
+    
+    def _next_timeout(self, futures, pending):
+        '''The seconds until the first running engine times out, engines waiting for a thread have not started.'''
+        if not self.engine_timeout:
+            return None
+        now = time()
+        started = [self._started_at[futures[f]] for f in pending if futures[f] in self._started_at]
+        if not started:
+            return self.engine_timeout
+        return max(0, min(started) + self.engine_timeout - now)
+    
     def output(self, output=out.PRINT, path=None):
         '''Prints search results and/or creates report files.'''
         output = (output or '').lower()
@@ -73,8 +167,8 @@ class MultipleSearchEngines(object):
 
 class AllSearchEngines(MultipleSearchEngines):
     '''Uses all search engines.'''
-    def __init__(self, proxy=cfg.PROXY, timeout=cfg.TIMEOUT):
+    def __init__(self, proxy=cfg.PROXY, timeout=cfg.TIMEOUT, max_workers=None, engine_timeout=None, prefetch=False):
         super(AllSearchEngines, self).__init__(
-            list(search_engines_dict), proxy, timeout
+            list(search_engines_dict), proxy, timeout, max_workers, engine_timeout, prefetch
         )
 
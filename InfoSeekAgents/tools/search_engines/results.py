@@ -1,7 +1,33 @@
 class SearchResults(object):
-    '''Stores the search results'''
+    '''Stores the search results
+    
+    Sets of the links, hosts and item fingerprints are kept up to date as items are added, 
+    so membership and duplicate checks take constant time.
+    '''
     def __init__(self, items=None):
-        self._results = items or []
+        self._results = []
+        self._links = set()
+        self._hosts = set()
+        self._fingerprints = set()
+        self.extend(items or [])
+    
+    @staticmethod
+    def _fingerprint(item):
+        '''Returns a hashable key of an item, equal for equal items.'''
+        return tuple(sorted(item.items()))
+    
+    def _index(self, item):
+        self._links.add(item.get('link'))
+        self._hosts.add(item.get('host'))
+        self._fingerprints.add(self._fingerprint(item))
+    
+    def has_link(self, link):
+        '''Checks if a result has this link.'''
+        return link in self._links
+    
+    def has_host(self, host):
+        '''Checks if a result has this domain.'''
+        return host in self._hosts
     
     def links(self):
         '''Returns the links found in search results'''
@@ -28,6 +54,12 @@ class SearchResults(object):
     
     def __len__(self):
         return len(self._results)
+    
+    def __contains__(self, item):
+        return self._fingerprint(item) in self._fingerprints
+    
+    def __iter__(self):
+        return iter(self._results)
 
     def __str__(self):
         return '<SearchResults ({} items)>'.format(len(self._results))
@@ -35,7 +67,9 @@ class SearchResults(object):
     def append(self, item):
         '''appends an item to the results list.'''
         self._results.append(item)
+        self._index(item)
     
     def extend(self, items):
         '''appends items to the results list.'''
-        self._results.extend(items)
+        for item in items:
+            self.append(item)
@@ -0,0 +1,73 @@
+"""The long-lived event loop on which the sync entry points of a process run their coroutines
+
+`asyncio.run` creates and closes a loop per call, and with it the async HTTP clients bound
+to that loop and their keep-alive connections. Running every coroutine on one loop per
+process, in a daemon thread, keeps them alive across queries. At process exit, pool workers
+included, the shutdown hooks run on the loop to close those clients, then the loop is closed.
+"""
+import asyncio
+import os
+import threading
+from multiprocessing import util
+
+_LOOP = None
+_THREAD = None
+_PID = None
+_LOCK = threading.Lock()
+_SHUTDOWN_HOOKS = []
+
+
+def add_shutdown_hook(hook) -> None:
+    """Registers a coroutine function awaited on a loop before it is closed"""
+    _SHUTDOWN_HOOKS.append(hook)
+
+
+async def run_shutdown_hooks() -> None:
+    """Awaits the shutdown hooks on the running loop, e.g. at the end of an `asyncio.run`"""
+    for hook in _SHUTDOWN_HOOKS:
+        try:
+            await hook()
+        except Exception as e:
+            print(f"Error closing the event loop resources: {e}")
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Returns the event loop of the current process, started on first use"""
+    global _LOOP, _THREAD, _PID
+    if _LOOP is None or _PID != os.getpid():
+        with _LOCK:
+            # a forked child inherits the loop but not the thread running it
+            if _LOOP is None or _PID != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="event-loop", daemon=True)
+                thread.start()
+                _LOOP, _THREAD, _PID = loop, thread, os.getpid()
+                # atexit handlers do not run in pool workers, multiprocessing finalizers do
+                util.Finalize(None, close_loop, exitpriority=10)
+    return _LOOP
+
+
+def run_sync(coro):
+    """Runs `coro` on the loop of the process and returns its result, blocking the calling thread"""
+    loop = get_loop()
+    if threading.current_thread() is _THREAD:
+        coro.close()
+        raise RuntimeError("run_sync called from the event loop thread, await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def close_loop() -> None:
+    """Runs the shutdown hooks on the loop of the process, then stops and closes it"""
+    global _LOOP
+    loop, thread = _LOOP, _THREAD
+    if loop is None or _PID != os.getpid() or loop.is_closed():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(run_shutdown_hooks(), loop).result(timeout=10)
+    except Exception as e:
+        print(f"Error closing the event loop: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    if not loop.is_running():
+        loop.close()
+    _LOOP = None
@@ -0,0 +1,138 @@
+"""On-disk caches shared by all worker processes of a run"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class SQLiteCache(object):
+    """A size-bounded key/value store with LRU eviction in a single SQLite file
+
+    Values are JSON-serializable objects stored zlib-compressed. The file can be shared
+    by several processes and threads: every thread of every process opens its own
+    connection, and writes are serialized by SQLite's lock in WAL mode.
+    Hit/miss counters are kept in the file too, so a run can report them across workers.
+    """
+    def __init__(self, path: str, max_bytes: int = 1 << 30, readonly: bool = False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.readonly = readonly
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            # connections must not be inherited across a fork
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                     "key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, accessed REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+
+    def get_entry(self, key: str):
+        """Returns (value, created timestamp) of `key`, or None"""
+        conn = self._connect()
+        row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if not self.readonly:
+            try:
+                conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.OperationalError:
+                pass
+        return json.loads(zlib.decompress(row[0])), row[1]
+
+    def get(self, key: str, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key: str, value) -> None:
+        """Stores `value`, then evicts the least recently used entries above `max_bytes`"""
+        self.set_many({key: value})
+
+    def set_many(self, items: dict, replace: bool = True) -> int:
+        """Stores all `items` in one transaction, then evicts the least recently used entries above `max_bytes`
+
+        Without `replace`, the keys already stored keep their value. Returns the number of values stored.
+        """
+        if self.readonly:
+            return 0
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            delta, stored = 0, 0
+            for key, value in items.items():
+                row = conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                if row and not replace:
+                    continue
+                data = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+                delta += len(data) - (row[0] if row else 0)
+                stored += 1
+                conn.execute("INSERT OR REPLACE INTO entries (key, value, size, created, accessed) "
+                             "VALUES (?, ?, ?, ?, ?)", (key, data, len(data), now, now))
+            total = self._incr(conn, "bytes", delta)
+            if total > self.max_bytes:
+                self._evict(conn, total - self.max_bytes)
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+        return stored
+
+    def _evict(self, conn, excess: int) -> None:
+        freed, keys = 0, []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if freed >= excess:
+                break
+            keys.append(key)
+            freed += size
+        conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+        self._incr(conn, "bytes", -freed)
+        self._incr(conn, "evictions", len(keys))
+
+    @staticmethod
+    def _incr(conn, name: str, value: int) -> int:
+        conn.execute("INSERT INTO counters (name, value) VALUES (?, ?) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, value))
+        return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """Increments a named counter, counters are best effort and never fail a lookup"""
+        try:
+            self._incr(self._connect(), name, value)
+        except sqlite3.OperationalError:
+            pass
+
+    def counters(self) -> dict:
+        return dict(self._connect().execute("SELECT name, value FROM counters").fetchall())
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def format_cache_report(name: str, before: dict, after: dict, prefix: str = "") -> str:
+    """Describes the hits and misses of a cache between two `counters()` snapshots
+
+    `prefix` selects the counters of one level of a cache storing several kinds of entries.
+    """
+    delta = {key[len(prefix):]: after.get(key, 0) - before.get(key, 0) for key in after if key.startswith(prefix)}
+    hits, misses = delta.get("hits", 0), delta.get("misses", 0)
+    rate = hits / (hits + misses) if hits + misses else 0.
+    extra = ", ".join(f"{key}={val}" for key, val in sorted(delta.items())
+                      if key not in ("hits", "misses", "bytes") and val)
+    report = f"{name}: {hits} hits, {misses} misses, hit rate {rate:.1%}, {after.get('bytes', 0) / 2 ** 20:.1f} MB on disk"
+    return report + (f", {extra}" if extra else "")
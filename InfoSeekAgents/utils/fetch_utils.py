@@ -0,0 +1,152 @@
+"""Tiered page fetching: a plain HTTP GET first, a headless browser only when the page needs it"""
+import re
+import threading
+from collections import Counter
+
+import requests
+
+from InfoSeekAgents.utils.http_utils import new_session
+from InfoSeekAgents.utils.selenium_utils import get_pagesource_with_selenium
+
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.5615.49 Safari/537.36"
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+JS_REQUIRED_PATTERN = re.compile(
+    r"(enable|turn on|activate) javascript|javascript (is )?(required|disabled|must be enabled)|"
+    r"requires javascript|checking your browser|just a moment\.\.\.",
+    re.IGNORECASE
+)
+TAG_PATTERN = re.compile(r"<script.*?</script>|<style.*?</style>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+
+FETCH_STATS = Counter()
+_STATS_LOCK = threading.Lock()
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """The session of the HTTP tier, with browser-like headers, on the shared connection pools"""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                session = new_session()
+                session.headers["User-Agent"] = USER_AGENT
+                session.headers["Accept"] = "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5"
+                session.headers["Accept-Encoding"] = "gzip, deflate, br"
+                session.headers["Accept-Language"] = "en-US,en;q=0.9,zh-CN;q=0.8"
+                _SESSION = session
+    return _SESSION
+
+
+def count(name: str) -> None:
+    with _STATS_LOCK:
+        FETCH_STATS[name] += 1
+
+
+def get_fetch_stats() -> dict:
+    """Returns how many pages each tier served, and why the HTTP tier escalated"""
+    with _STATS_LOCK:
+        return {"tiers": dict(FETCH_STATS)}
+
+
+def get_validators(resp: requests.Response) -> dict:
+    """The ETag and Last-Modified headers of a response, to revalidate a cached copy later"""
+    validators = dict()
+    if resp.headers.get("ETag"):
+        validators["etag"] = resp.headers["ETag"]
+    if resp.headers.get("Last-Modified"):
+        validators["last_modified"] = resp.headers["Last-Modified"]
+    return validators
+
+
+def read_html_response(resp: requests.Response) -> tuple[str, str, dict]:
+    """Returns the html of a response, or None, the reason it could not be used, and its validators"""
+    if resp.status_code != 200:
+        return None, f"http_{resp.status_code}", dict()
+    content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type not in HTML_CONTENT_TYPES:
+        return None, "content_type", dict()
+    if "charset" not in resp.headers.get("Content-Type", "").lower():
+        # requests falls back to ISO-8859-1 for text/* without a charset, detect it from the body
+        resp.encoding = resp.apparent_encoding
+    return resp.text, "", get_validators(resp)
+
+
+def http_get_html(url: str, timeout: float = 10, headers: dict = None) -> tuple[str, str, dict]:
+    """Fetches a page with a pooled, compressed HTTP GET
+
+    Returns:
+        Tuple[str, str, dict]: The html of the page, or None, the reason it could not be used,
+            and the validators of the response
+    """
+    try:
+        resp = get_session().get(url, headers=headers, timeout=timeout)
+    except requests.exceptions.RequestException:
+        return None, "http_error", dict()
+    return read_html_response(resp)
+
+
+def revalidate_page(url: str, validators: dict, timeout: float = 10) -> tuple[bool, tuple]:
+    """Revalidates a cached copy of a page with a conditional GET
+
+    Returns:
+        Tuple[bool, tuple]: Whether the server confirmed with a 304 that the copy is current, and
+            otherwise the `http_get_html` result of the GET, to pass to `fetch_page`, or None
+            when the copy has no validators and no request was made
+    """
+    headers = dict()
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    if not headers:
+        return False, None
+    response = http_get_html(url, timeout, headers=headers)
+    if response[1] == "http_304":
+        return True, None
+    return False, response
+
+
+def needs_javascript(html: str, min_text_length: int = 500) -> bool:
+    """Guesses whether the static html of a page lacks the content a browser would render"""
+    text = " ".join(TAG_PATTERN.sub(" ", html).split())
+    if len(text) < min_text_length:
+        return True
+    if len(text) < 4 * min_text_length and JS_REQUIRED_PATTERN.search(text):
+        return True
+    return False
+
+
+def fetch_page(url: str, selenium_web_browser: str = "chrome", http_first: bool = True,
+               timeout: float = 10, min_text_length: int = 500, response: tuple = None) -> tuple[str, dict]:
+    """Returns the html of a page, rendering it in a headless browser only when needed
+
+    Args:
+        url (str): The url of the page
+        selenium_web_browser (str): The browser of the fallback tier
+        http_first (bool): Whether to try a plain HTTP GET before the browser
+        timeout (float): The timeout of the HTTP GET
+        min_text_length (int): Pages with less visible text are rendered in the browser
+        response (tuple): The `http_get_html` result of a GET already made, used in place of the HTTP tier's own
+
+    Returns:
+        Tuple[str, dict]: The html of the page, and its ETag/Last-Modified when served over HTTP
+    """
+    if http_first:
+        html, reason, validators = response if response is not None else http_get_html(url, timeout)
+        if html is not None and needs_javascript(html, min_text_length):
+            html, reason = None, "needs_javascript"
+        if html is not None:
+            count("http")
+            return html, validators
+        count(f"escalated_{reason}")
+    page_source = get_pagesource_with_selenium(url, selenium_web_browser)
+    count("selenium")
+    return page_source, dict()
+
+
+def fetch_page_source(url: str, selenium_web_browser: str = "chrome", http_first: bool = True,
+                      timeout: float = 10, min_text_length: int = 500) -> str:
+    """Returns the html of a page, see `fetch_page`"""
+    return fetch_page(url, selenium_web_browser, http_first, timeout, min_text_length)[0]
@@ -3,6 +3,8 @@ from __future__ import annotations
 
 from requests.compat import urljoin
 from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
 
 
 def convert_bs_html_table_to_list(table):
@@ -64,6 +66,43 @@ def extract_hyperlinks(soup: BeautifulSoup, base_url: str) -> list[tuple[str, st
     ]
 
 
+def parse_page(page_source: str, base_url: str) -> tuple[str, list[tuple[str, str]]]:
+    """Parse a page once and extract both its visible text and its hyperlinks
+
+    Builds a single lxml DOM, strips <script> and <style>, then reads the text of
+    <body> and every <a href> of the document from that same tree.
+
+    Args:
+        page_source (str): The html of the page
+        base_url (str): The url of the page, to resolve relative links
+
+    Returns:
+        Tuple[str, List[Tuple[str, str]]]: The text and the extracted hyperlinks
+    """
+    if not page_source or not page_source.strip():
+        return "", list()
+    try:
+        tree = lxml.html.document_fromstring(page_source)
+    except ValueError:
+        # unicode strings with an xml encoding declaration must be parsed as bytes
+        tree = lxml.html.document_fromstring(page_source.encode("utf-8"))
+    except etree.ParserError:
+        return "", list()
+    etree.strip_elements(tree, "script", "style", with_tail=False)
+
+    body = tree.find("body")
+    text = (body if body is not None else tree).text_content()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    text = "\n".join(chunk for chunk in chunks if chunk)
+
+    hyperlinks = [
+        (link.text_content(), urljoin(base_url, link.get("href")))
+        for link in tree.iter("a") if link.get("href") is not None
+    ]
+    return text, hyperlinks
+
+
 def format_hyperlinks(hyperlinks: list[tuple[str, str]]) -> list[str]:
     """Format hyperlinks to be displayed to the user
 
@@ -0,0 +1,162 @@
+"""The HTTP transport shared by all tools and LLM clients of a process
+
+Every `requests` session created here is mounted on one connection pool per host, with
+per-host connection limits, a default timeout and retries of failed connections, so
+keep-alive connections are reused across tools. Latency, connection reuse and rate
+limited (HTTP 429) responses are recorded per host, keyed by host name without the port,
+whether they come from `requests`, urllib3 pools or httpx.
+"""
+from __future__ import annotations
+import importlib.util
+import threading
+import time
+from collections import defaultdict, OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from InfoSeekAgents.config import CFG
+
+
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+_ADAPTER = None
+_SESSION = None
+_LOCK = threading.Lock()
+HOST_STATS = defaultdict(lambda: {"requests": 0, "errors": 0, "rate_limited": 0, "latency_ms": 0, "http2": 0,
+                                  "connections": 0})
+_STATS_LOCK = threading.Lock()
+
+
+def get_adapter() -> HTTPAdapter:
+    """The process-wide adapter holding the connection pools"""
+    global _ADAPTER
+    if _ADAPTER is None:
+        with _LOCK:
+            if _ADAPTER is None:
+                retries = Retry(
+                    total=CFG.http_max_retries,
+                    status_forcelist=(502, 504),
+                    backoff_factor=0.5,
+                    raise_on_status=False,
+                    respect_retry_after_header=True
+                )
+                _ADAPTER = HTTPAdapter(pool_connections=CFG.http_pool_hosts, pool_maxsize=CFG.http_pool_maxsize,
+                                       max_retries=retries, pool_block=True)
+    return _ADAPTER
+
+
+def record(host: str, latency: float = None, error: bool = False, http2: bool = False, status: int = None) -> None:
+    with _STATS_LOCK:
+        stats = HOST_STATS[host]
+        stats["requests"] += 1
+        stats["errors"] += int(error)
+        stats["rate_limited"] += int(status == 429)
+        stats["http2"] += int(http2)
+        if latency is not None:
+            stats["latency_ms"] += int(latency * 1000)
+
+
+def record_connection(host: str) -> None:
+    with _STATS_LOCK:
+        HOST_STATS[host]["connections"] += 1
+
+
+class PooledSession(requests.Session):
+    """A session on the shared connection pools, with a default timeout and per-host metrics
+
+    Headers, cookies and proxies stay per session, only the connections are shared.
+    """
+    def __init__(self, timeout: float = None):
+        super(PooledSession, self).__init__()
+        self.timeout = timeout
+        adapter = get_adapter()
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).hostname or ""
+        start = time.perf_counter()
+        try:
+            resp = super(PooledSession, self).request(method, url, *args, **kwargs)
+        except requests.exceptions.RequestException:
+            record(host, error=True)
+            raise
+        record(host, time.perf_counter() - start, status=resp.status_code)
+        return resp
+
+    def close(self):
+        """Detaches the session, the shared pools stay open for the other sessions"""
+        self.adapters = OrderedDict()
+
+
+def new_session(timeout: float = None) -> PooledSession:
+    """A new session with its own headers and cookies, on the shared connection pools"""
+    return PooledSession(timeout)
+
+
+def get_session() -> PooledSession:
+    """The process-wide session for one-off API calls, with the `CFG.http_timeout` default timeout"""
+    global _SESSION
+    if _SESSION is None:
+        with _LOCK:
+            if _SESSION is None:
+                _SESSION = PooledSession(CFG.http_timeout)
+    return _SESSION
+
+
+def httpx_client_kwargs(is_async: bool = False) -> dict:
+    """Arguments of the httpx client of the openai SDK: HTTP/2 when `h2` is installed, and per-host metrics
+
+    The connections opened are counted from the trace events of the httpx transport.
+    """
+    def on_request(request):
+        host = request.url.host
+
+        def trace(event, info):
+            if event == "connection.connect_tcp.complete":
+                record_connection(host)
+
+        async def atrace(event, info):
+            trace(event, info)
+
+        request.extensions["start_time"] = time.perf_counter()
+        request.extensions["trace"] = atrace if is_async else trace
+
+    def on_response(response):
+        start = response.request.extensions.get("start_time")
+        record(response.request.url.host, time.perf_counter() - start if start else None,
+               http2=response.http_version == "HTTP/2", status=response.status_code)
+
+    async def aon_request(request):
+        on_request(request)
+
+    async def aon_response(response):
+        on_response(response)
+
+    if is_async:
+        hooks = {"request": [aon_request], "response": [aon_response]}
+    else:
+        hooks = {"request": [on_request], "response": [on_response]}
+    return {"http2": HTTP2, "event_hooks": hooks}
+
+
+def get_http_stats() -> dict:
+    """Returns, per host, requests, errors, rate limited responses, total latency, and connections opened vs
+    requests that reused an open connection"""
+    with _STATS_LOCK:
+        stats = {host: dict(host_stats) for host, host_stats in HOST_STATS.items()}
+    if _ADAPTER is not None:
+        managers = [_ADAPTER.poolmanager] + list(_ADAPTER.proxy_manager.values())
+        for manager in managers:
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                stats.setdefault(pool.host, HOST_STATS.default_factory())["connections"] += pool.num_connections
+    for host_stats in stats.values():
+        host_stats["reused"] = max(0, host_stats["requests"] - host_stats["connections"])
+    return stats
@@ -1,10 +1,12 @@
 import json
 import re
 """Text processing functions"""
-from typing import Generator, Optional, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Generator, Optional, Dict, List, Tuple
 from selenium.webdriver.remote.webdriver import WebDriver
 from InfoSeekAgents.config import Config
 from InfoSeekAgents.llms import create_chat_completion
+from InfoSeekAgents.utils.page_cache import get_page_cache, get_summary_key, count
 
 
 def split_sentences(text, lang='en'):
@@ -108,56 +110,102 @@ def summarize_text(
             cnt += len(batch)
             cfg.chain_logger.put("reading", f"{cnt} / {len(chunks)} 个段落")
     else:
-        for i, chunk in enumerate(chunks):
-            if driver:
-                scroll_to_percentage(driver, scroll_ratio * i)
-            # print(f"Adding chunk {i + 1} / {len(chunks)} to memory")
-
-            # memory_to_add = f"Source: {url}\n" f"Raw content part#{i + 1}: {chunk}"
-
-            # MEMORY.add(memory_to_add)
-
-
-            cfg.chain_logger.put("reading", f"第 {i + 1} / {len(chunks)} 个段落")
-            message = create_message(chunk, question)
-
-            try:
-                summary, _ = create_chat_completion(
-                    query=message,
-                    llm_model_name=cfg.fast_llm_model,
-                    max_tokens=cfg.browse_summary_max_token,
-                )
-            except:
-                summary = ""
-            summaries.append(summary)
-            
-            prompt_responses.append((message, summary))
-        # print(f"Added chunk {i + 1} summary to memory")
-
-        # memory_to_add = f"Source: {url}\n" f"Content summary part#{i + 1}: {summary}"
-
-        # MEMORY.add(memory_to_add)
+        summaries, chunk_prompt_responses = summarize_chunks(chunks, question, cfg, progress=True, driver=driver)
+        prompt_responses.extend(chunk_prompt_responses)
     # print(len(summaries))
     if len(summaries) == 1:
-        return summary, prompt_responses
+        return summaries[0], prompt_responses
     if len(summaries) == 0:
         return "", prompt_responses
     cfg.chain_logger.put("reading", f"总结这 {len(chunks)} 个段落")
     # print(f"Summarized {len(chunks)} chunks.")
 
+    # tree-reduce: combine the summaries group by group until they fit in one chunk
     combined_summary = "\n".join(summaries)
+    while len(combined_summary) > cfg.browse_chunk_max_length and len(summaries) > 1:
+        groups = list(split_text(combined_summary, cfg.browse_chunk_max_length))
+        if len(groups) >= len(summaries):
+            # summaries about as long as their chunks, merge them two by two so that every round reduces
+            groups = ["\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+        summaries, group_prompt_responses = summarize_chunks(groups, question, cfg)
+        prompt_responses.extend(group_prompt_responses)
+        combined_summary = "\n".join(summaries)
+    # a single summary may still exceed the budget
+    combined_summary = combined_summary[:cfg.browse_chunk_max_length]
     message = create_message(combined_summary, question)
-
-    summary, _ = create_chat_completion(
-            query=message,
-            llm_model_name=cfg.fast_llm_model,
-            max_tokens=cfg.browse_summary_max_token,
-        )
+    summary = summarize_chunk(combined_summary, question, cfg)
     prompt_responses.append((message, summary))
 
     return summary, prompt_responses
 
 
+def summarize_chunks(
+    chunks: List[str], question: str, cfg: Config, progress: bool = False, driver: Optional[WebDriver] = None
+) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Summarize chunks concurrently, at most `cfg.browse_summary_max_concurrency` at a time
+
+    Args:
+        chunks (List[str]): The chunks of text to summarize
+        question (str): The question to ask the model
+        cfg (Config): The config of the global agent
+        progress (bool): Whether to report each finished chunk to the chain logger
+        driver (WebDriver): The webdriver to scroll along the reading progress, from the calling thread
+
+    Returns:
+        Tuple[List[str], List[Tuple[str, str]]]: The summaries and (prompt, response) pairs, in chunk order
+    """
+    messages = [create_message(chunk, question) for chunk in chunks]
+    summaries = [""] * len(chunks)
+
+    def summarize(i):
+        try:
+            summary = summarize_chunk(chunks[i], question, cfg)
+        except:
+            summary = ""
+        return i, summary
+
+    max_workers = max(1, min(cfg.browse_summary_max_concurrency, len(chunks)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(summarize, i) for i in range(len(chunks))]
+        for cnt, future in enumerate(as_completed(futures)):
+            i, summary = future.result()
+            summaries[i] = summary
+            if driver:
+                scroll_to_percentage(driver, cnt / len(chunks))
+            if progress:
+                cfg.chain_logger.put("reading", f"第 {cnt + 1} / {len(chunks)} 个段落")
+    return summaries, list(zip(messages, summaries))
+
+
+def summarize_chunk(chunk: str, question: str, cfg: Config) -> str:
+    """Summarize one chunk, reusing the summary of the same chunk and question from the page cache
+
+    Args:
+        chunk (str): The chunk of text to summarize
+        question (str): The question to ask the model
+        cfg (Config): The config of the global agent
+
+    Returns:
+        str: The summary of the chunk
+    """
+    cache = get_page_cache(cfg)
+    if cache is not None:
+        key = get_summary_key(chunk, question, cfg.fast_llm_model)
+        summary = cache.get(key)
+        if summary is not None:
+            count(cache, "summary_hits")
+            return summary
+        count(cache, "summary_misses")
+    summary, _ = create_chat_completion(
+        query=create_message(chunk, question),
+        llm_model_name=cfg.fast_llm_model,
+        max_tokens=cfg.browse_summary_max_token,
+    )
+    if cache is not None and summary:
+        cache.set(key, summary)
+    return summary
+
+
 def scroll_to_percentage(driver: WebDriver, ratio: float) -> None:
     """Scroll to a percentage of the page
 
@@ -0,0 +1,48 @@
+"""Two-level cache of browsed pages: the text and links of a url, and chunk summaries per question"""
+from __future__ import annotations
+import hashlib
+import json
+import threading
+from collections import Counter
+
+from InfoSeekAgents.utils.cache_utils import SQLiteCache
+
+
+_CACHES = dict()
+_CACHES_LOCK = threading.Lock()
+PAGE_CACHE_STATS = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+def get_page_cache(cfg) -> SQLiteCache | None:
+    """Returns the page cache configured by `cfg.page_cache_path`, None when it is off"""
+    if not cfg.page_cache_path:
+        return None
+    if cfg.page_cache_path not in _CACHES:
+        with _CACHES_LOCK:
+            if cfg.page_cache_path not in _CACHES:
+                _CACHES[cfg.page_cache_path] = SQLiteCache(
+                    cfg.page_cache_path, max_bytes=int(cfg.page_cache_max_mb * 2 ** 20))
+    return _CACHES[cfg.page_cache_path]
+
+
+def get_page_key(url: str) -> str:
+    return "page:" + hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def get_summary_key(chunk: str, question: str, model: str) -> str:
+    chunk_hash = hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+    content = json.dumps([model.lower(), question, chunk_hash], ensure_ascii=False)
+    return "summary:" + hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def count(cache: SQLiteCache, name: str) -> None:
+    with _STATS_LOCK:
+        PAGE_CACHE_STATS[name] += 1
+    cache.incr(name)
+
+
+def get_page_cache_stats() -> dict:
+    """Returns the page and summary lookups of this process, by outcome"""
+    with _STATS_LOCK:
+        return {"lookups": dict(PAGE_CACHE_STATS)}
@@ -0,0 +1,125 @@
+"""Token-bucket rate limits per search provider, shared by all worker processes through lock files"""
+from __future__ import annotations
+import asyncio
+import getpass
+import glob
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets are only shared by the threads of one process
+    fcntl = None
+
+
+_LIMITERS = dict()
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_state_dir(run_id: str) -> str:
+    """The default state directory of the buckets of a run, private to the current user"""
+    user = str(os.getuid()) if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f"infoseek_rate_limits_{user}", run_id)
+
+
+def reset_rate_limits(state_dir: str) -> None:
+    """Removes the bucket states left in `state_dir` by an earlier run, before the workers of a run start"""
+    for path in glob.glob(os.path.join(state_dir, "*.bucket")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class TokenBucket(object):
+    """A token bucket refilled at `rate` tokens per second, holding at most `capacity` tokens
+
+    The state of the bucket is kept in `<state_dir>/<name>.bucket` and updated under an
+    exclusive `flock`, so every process of a run draws from the same bucket. A caller
+    reserves a token, possibly driving the bucket negative, and then waits outside the lock
+    for as long as the reservation requires; only the threads using a throttled provider wait.
+    """
+    def __init__(self, name: str, rate: float, capacity: float, state_dir: str):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.path = os.path.join(state_dir, f"{name}.bucket")
+        os.makedirs(state_dir, mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        self._state = None
+        self.stats = {"acquired": 0, "throttled": 0, "wait_seconds": 0.}
+
+    def _refill(self, state, now):
+        tokens, last = state if state else (self.capacity, now)
+        return min(self.capacity, tokens + (now - last) * self.rate), now
+
+    def reserve(self) -> float:
+        """Takes one token, returns the number of seconds to wait before using it"""
+        with self._lock:
+            if fcntl is None:
+                tokens, now = self._refill(self._state, time.time())
+                self._state = (tokens - 1, now)
+            else:
+                with open(self.path, "a+") as file:
+                    fcntl.flock(file, fcntl.LOCK_EX)
+                    try:
+                        file.seek(0)
+                        content = file.read().split()
+                        state = (float(content[0]), float(content[1])) if len(content) == 2 else None
+                        tokens, now = self._refill(state, time.time())
+                        file.seek(0)
+                        file.truncate()
+                        file.write(f"{tokens - 1} {now}")
+                        file.flush()
+                    finally:
+                        fcntl.flock(file, fcntl.LOCK_UN)
+            wait = max(0., (1 - tokens) / self.rate)
+            self.stats["acquired"] += 1
+            if wait > 0:
+                self.stats["throttled"] += 1
+                self.stats["wait_seconds"] += round(wait, 3)
+        return wait
+
+    def acquire(self) -> None:
+        """Blocks the calling thread until a token is available"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        """Waits for a token without blocking the event loop, taking it under the file lock in a thread"""
+        wait = await asyncio.to_thread(self.reserve)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def get_rate_limiter(provider: str, cfg) -> TokenBucket | None:
+    """Returns the bucket of `provider` configured in `cfg.search_rate_limits`, None if it is unlimited
+
+    `cfg.search_rate_limits` maps a provider to a (requests per second, burst) pair. The buckets
+    are shared through `cfg.rate_limit_dir`, which the entry point of a run sets and resets for all
+    its workers; without it, they are private to the process.
+    """
+    limit = cfg.search_rate_limits.get(provider)
+    if not limit:
+        return None
+    key = (provider, cfg.rate_limit_dir)
+    if key not in _LIMITERS:
+        with _LIMITERS_LOCK:
+            if key not in _LIMITERS:
+                rate, capacity = limit
+                state_dir = cfg.rate_limit_dir
+                if state_dir is None:
+                    # a reused pid may find the state of an earlier process
+                    state_dir = get_state_dir(f"pid_{os.getpid()}")
+                    reset_rate_limits(state_dir)
+                _LIMITERS[key] = TokenBucket(provider, rate, capacity, state_dir)
+    return _LIMITERS[key]
+
+
+def get_rate_limit_stats() -> dict:
+    """Returns, per provider, the tokens taken by this process and how long it waited for them"""
+    with _LIMITERS_LOCK:
+        return {limiter.name: dict(limiter.stats) for limiter in _LIMITERS.values()}
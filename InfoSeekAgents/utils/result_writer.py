@@ -0,0 +1,329 @@
+"""Append-only JSONL result files, plain or gzip-compressed, written by a single writer thread
+
+A path ending in `.gz` is gzip-compressed: every batch is appended as its own gzip member,
+so the file stays readable up to the last complete batch after a crash. A writer cuts the
+record or member a crash left half-written off the end of the file before appending to it.
+
+The sidecar index `<path>.idx` lists the query key of every record with the size of the
+result file once the record was written, so resuming a run reads the index instead of the
+results. Records appended past the last indexed offset are found by scanning only the tail.
+"""
+import gzip
+import json
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+import zlib
+
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(".gz")
+
+
+def open_results(path: str, mode: str = "r"):
+    """Opens a result file in text mode, decompressing it if it ends with `.gz`"""
+    if is_compressed(path):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8", errors="replace")
+
+
+def read_results(path: str):
+    """Yields the records of a result file, stopping at a record or gzip member cut off by a crash"""
+    with open_results(path) as file:
+        try:
+            for line in file:
+                if not line.strip():
+                    continue
+                if line.endswith("\n"):
+                    yield json.loads(line)
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return
+
+
+def write_results(path: str, records) -> None:
+    """Replaces the content of a result file with `records`"""
+    with open_results(path, "w") as file:
+        for record in records:
+            json.dump(record, file, ensure_ascii=False)
+            file.write('\n')
+
+
+def get_index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def scan_keys(path: str, key: str, offset: int = 0) -> list:
+    """Returns the `key` of every record of a result file from `offset`, the start of a line or gzip member
+
+    The key is matched in the raw line, the first occurrence being the top-level one since
+    the query fields precede the result, and lines are only parsed when it is not found.
+    """
+    pattern = re.compile(rb'(?<!\\)"' + re.escape(json.dumps(key).encode("utf-8")[1:-1]) +
+                         rb'": ("(?:[^"\\]|\\.)*")')
+    keys = []
+    with open(path, "rb") as raw:
+        raw.seek(offset)
+        file = gzip.GzipFile(fileobj=raw) if is_compressed(path) else raw
+        try:
+            for line in file:
+                if not line.strip():
+                    continue
+                match = pattern.search(line) if line.endswith(b"\n") else None
+                if match:
+                    keys.append(json.loads(match.group(1)))
+                    continue
+                try:
+                    keys.append(json.loads(line)[key])
+                except json.JSONDecodeError:
+                    if line.endswith(b"\n"):
+                        raise
+                    break
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            pass
+    return keys
+
+
+def find_complete_end(path: str, offset: int = 0) -> int:
+    """Returns the end of the last complete record, or gzip member, of a result file from `offset`
+
+    `offset` is the end of a record or member, e.g. one covered by the index.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        if not is_compressed(path):
+            # records are whole lines, a cut off one has no newline
+            end = size
+            while end > offset:
+                start = max(offset, end - (1 << 16))
+                file.seek(start)
+                newline = file.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    return start + newline + 1
+                end = start
+            return offset
+        file.seek(offset)
+        end = position = offset
+        decompressor = zlib.decompressobj(wbits=31)
+        while True:
+            data = file.read(1 << 20)
+            if not data:
+                return end
+            while data:
+                try:
+                    decompressor.decompress(data)
+                except zlib.error:
+                    return end
+                if not decompressor.eof:
+                    position += len(data)
+                    break
+                position += len(data) - len(decompressor.unused_data)
+                end = position
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=31)
+
+
+def repair_results(path: str, offset: int = 0) -> int:
+    """Truncates a result file after its last complete record or member, returns its new size"""
+    end = find_complete_end(path, offset)
+    if end < os.path.getsize(path):
+        print(f"Truncating {os.path.getsize(path) - end} bytes cut off by a crash at the end of {path}")
+        with open(path, "r+b") as file:
+            file.truncate(end)
+    return end
+
+
+def format_index_line(offset: int, value) -> str:
+    return f"{offset}\t{json.dumps(value, ensure_ascii=False)}\n"
+
+
+def read_index(path: str, key: str):
+    """Returns the indexed keys of a result file and the file size they cover, or None without a usable index"""
+    index_path = get_index_path(path)
+    if not os.path.exists(index_path):
+        return None
+    keys, offset = [], 0
+    with open(index_path, "r", encoding="utf-8") as file:
+        if file.readline() != f"# {key}\n":
+            return None
+        for line in file:
+            if not line.endswith("\n"):
+                break
+            end, _, value = line.partition("\t")
+            try:
+                keys.append(json.loads(value))
+                offset = int(end)
+            except ValueError:
+                return None
+    return keys, offset
+
+
+def write_index(path: str, key: str, keys: list, size: int = None) -> None:
+    """Replaces the index of a result file by `keys`, all covering the file up to `size`, by default all of it"""
+    if size is None:
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+    with open(get_index_path(path), "w", encoding="utf-8") as file:
+        file.write(f"# {key}\n")
+        for value in keys:
+            file.write(format_index_line(size, value))
+
+
+def load_finished_keys(path: str, key: str) -> list:
+    """Returns the `key` of every record of a result file, bringing its index up to date
+
+    The index is trusted up to the offset it covers, the records after it are scanned and
+    indexed. An index of another key or covering more than the file, which has been
+    rewritten since, is rebuilt by scanning the whole file. A record or member cut off by
+    a crash is first truncated, so the index only covers records that can be read.
+    """
+    index = read_index(path, key)
+    if index is None or index[1] > os.path.getsize(path):
+        end = repair_results(path)
+        keys = scan_keys(path, key)
+        write_index(path, key, keys, end)
+        return keys
+    keys, offset = index
+    end = repair_results(path, offset)
+    if offset < end:
+        tail = scan_keys(path, key, offset)
+        with open(get_index_path(path), "a", encoding="utf-8") as file:
+            for value in tail:
+                file.write(format_index_line(end, value))
+        keys += tail
+    return keys
+
+
+_STOP = object()
+
+
+class ResultWriter(object):
+    """Appends records put by any thread of the process to one result file
+
+    Records are serialized and appended by a dedicated thread, in batches of up to
+    `batch_size` records or whatever arrived within `flush_interval` seconds, and the
+    file is fsynced at most every `fsync_interval` seconds, and on `sync` and `close`.
+    With `key`, the `key` of every record is appended to the index once the record is written.
+    """
+    def __init__(self, path: str, key: str = None, batch_size: int = 64, flush_interval: float = 1.0,
+                 fsync_interval: float = 5.0):
+        self.path = path
+        self.key = key
+        self.compress = is_compressed(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.error = None
+        self.stats = {"records": 0, "batches": 0, "fsyncs": 0, "bytes": 0, "written_bytes": 0, "write_seconds": 0.}
+        self._queue = queue.Queue()
+        self._started_at = time.time()
+        if not os.path.exists(path):
+            if key is not None:
+                write_index(path, key, [])
+        elif key is not None:
+            # repairs the tail after the indexed records
+            load_finished_keys(path, key)
+        else:
+            repair_results(path)
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record: dict) -> None:
+        if self.error is not None:
+            raise self.error
+        self._queue.put(record)
+
+    def sync(self) -> None:
+        """Blocks until every record put so far is written and fsynced"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        if self.error is not None:
+            raise self.error
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size and isinstance(batch[-1], dict):
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, file, records: list) -> None:
+        start = time.perf_counter()
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        written = gzip.compress(data) if self.compress else data
+        file.write(written)
+        file.flush()
+        if self.key is not None:
+            end = file.tell()
+            with open(get_index_path(self.path), "a", encoding="utf-8") as index:
+                index.write("".join(format_index_line(end, record[self.key]) for record in records))
+        self.stats["records"] += len(records)
+        self.stats["batches"] += 1
+        self.stats["bytes"] += len(data)
+        self.stats["written_bytes"] += len(written)
+        self.stats["write_seconds"] += time.perf_counter() - start
+
+    def _fsync(self, file) -> None:
+        start = time.perf_counter()
+        os.fsync(file.fileno())
+        self.stats["fsyncs"] += 1
+        self.stats["write_seconds"] += time.perf_counter() - start
+
+    def _run(self):
+        last_fsync = time.time()
+        with open(self.path, "ab") as file:
+            while True:
+                batch = self._next_batch()
+                # only the last item of a batch can be a sync event or the stop marker
+                records = [item for item in batch if isinstance(item, dict)]
+                marker = None if isinstance(batch[-1], dict) else batch[-1]
+                if records and self.error is None:
+                    try:
+                        self._write(file, records)
+                    except Exception as e:
+                        print(traceback.format_exc())
+                        self.error = e
+                if self.error is None and (marker is not None or time.time() - last_fsync >= self.fsync_interval):
+                    try:
+                        self._fsync(file)
+                    except Exception as e:
+                        self.error = e
+                    last_fsync = time.time()
+                if isinstance(marker, threading.Event):
+                    marker.set()
+                elif marker is _STOP:
+                    break
+
+    def report(self) -> str:
+        elapsed = max(time.time() - self._started_at, 1e-9)
+        stats = self.stats
+        ratio = f", compressed to {stats['written_bytes'] / max(stats['bytes'], 1):.1%}" if self.compress else ""
+        return (f"Result writer: {stats['records']} records in {stats['batches']} batches, "
+                f"{stats['bytes'] / 2 ** 20:.1f} MB{ratio}, {stats['fsyncs']} fsyncs, "
+                f"{stats['write_seconds']:.2f}s writing, {stats['records'] / elapsed:.2f} records/s "
+                f"and {stats['bytes'] / 2 ** 20 / elapsed:.2f} MB/s over {elapsed:.0f}s")
@@ -0,0 +1,152 @@
+"""Retry delays with capped, jittered exponential backoff, circuit breakers per provider, and an adaptive
+concurrency limit"""
+from __future__ import annotations
+import asyncio
+import random
+import threading
+import time
+
+
+class ProviderBannedError(RuntimeError):
+    """A provider refused a request with 403, 429 or 503, or reported a rate limit"""
+
+
+class RetryPolicy(object):
+    """Capped exponential backoff with full jitter
+
+    The delay before retry `attempt` (0 for the first retry) is drawn uniformly from
+    [0, min(cap, base * 2 ** attempt)], which spreads the retries of concurrent workers.
+    """
+    def __init__(self, max_attempts: int = 5, base: float = 1, cap: float = 30):
+        self.max_attempts = max_attempts
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    def sleep(self, attempt: int) -> None:
+        time.sleep(self.delay(attempt))
+
+    async def asleep(self, attempt: int) -> None:
+        await asyncio.sleep(self.delay(attempt))
+
+
+class CircuitBreaker(object):
+    """Stops calling a provider after repeated failures or a ban, for a cool-down period
+
+    closed: calls pass, `failure_threshold` consecutive failures open the breaker, a ban opens it at once
+    open: calls are refused until `cooldown` seconds have passed, then the breaker is half open
+    half_open: a single probe call passes, its success closes the breaker and its failure opens it again
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 120):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "bans": 0,
+                      "opened": 0, "short_circuited": 0, "probes": 0}
+
+    def allow(self) -> bool:
+        """Whether the provider may be called now"""
+        with self._lock:
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                self.stats["calls"] += 1
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self.stats["calls"] += 1
+                self.stats["probes"] += 1
+                return True
+            self.stats["short_circuited"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.stats["successes"] += 1
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release(self) -> None:
+        """Gives back a call let through by `allow` that was not made, e.g. cancelled while throttled"""
+        with self._lock:
+            self.stats["calls"] -= 1
+            if self.state == self.HALF_OPEN and self._probing:
+                self.stats["probes"] -= 1
+                self._probing = False
+
+    def record_failure(self, banned: bool = False) -> None:
+        with self._lock:
+            self.stats["failures"] += 1
+            self.stats["bans"] += int(banned)
+            self.failures += 1
+            if banned or self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.stats["opened"] += 1
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self._probing = False
+
+
+class AdaptiveLimit(object):
+    """A concurrency limit adapted to the rate limiting of the providers, by additive increase, multiplicative decrease
+
+    A rate limited task halves the limit, once for all the tasks started before the decrease since they
+    ran at the former limit. `limit` tasks in a row without rate limiting raise it by one, up to `max_limit`.
+    """
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = max_limit
+        self._clean = 0
+        self._decreased_at = 0.
+        self.stats = {"decreases": 0, "increases": 0, "lowest": max_limit}
+
+    def record(self, rate_limited: bool, started_at: float) -> None:
+        """Adapts the limit to a task started at `started_at` that just ended"""
+        if rate_limited:
+            self._clean = 0
+            if started_at >= self._decreased_at and self.limit > self.min_limit:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self._decreased_at = time.time()
+                self.stats["decreases"] += 1
+                self.stats["lowest"] = min(self.stats["lowest"], self.limit)
+            return
+        self._clean += 1
+        if self._clean >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._clean = 0
+            self.stats["increases"] += 1
+
+
+_BREAKERS = dict()
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_circuit_breaker(provider: str, cfg) -> CircuitBreaker:
+    """Returns the process-wide circuit breaker of `provider`"""
+    if provider not in _BREAKERS:
+        with _BREAKERS_LOCK:
+            if provider not in _BREAKERS:
+                _BREAKERS[provider] = CircuitBreaker(
+                    provider, cfg.breaker_failure_threshold, cfg.breaker_cooldown)
+    return _BREAKERS[provider]
+
+
+def get_breaker_stats() -> dict:
+    """Returns the calls, failures and state transitions of every breaker, `open` is 1 while it is open"""
+    with _BREAKERS_LOCK:
+        return {
+            breaker.name: dict(breaker.stats, open=int(breaker.state == CircuitBreaker.OPEN))
+            for breaker in _BREAKERS.values()
+        }
@@ -1,4 +1,9 @@
+import asyncio
 import os
+import queue
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from multiprocessing import util
 
 from selenium import webdriver
 from selenium.webdriver.remote.webdriver import WebDriver
@@ -14,6 +19,8 @@ import logging
 
 import time
 
+from InfoSeekAgents.config import CFG
+
 
 def get_web_driver(selenium_web_browser):
     options_available = {
@@ -49,12 +56,169 @@ def get_web_driver(selenium_web_browser):
     return current_driver
 
 
+def is_driver_alive(driver: WebDriver) -> bool:
+    """Checks that the browser behind a webdriver still responds"""
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+
+def quit_driver(driver: WebDriver) -> None:
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+class WebDriverPool(object):
+    """A bounded pool of warm webdrivers shared by all tools of the process
+
+    Drivers are checked out for one page at a time, health-checked on checkout and
+    recycled after `max_pages` pages. At most `max_size` browsers exist at once,
+    further checkouts block until a driver is returned, and fail after `checkout_timeout`
+    seconds so that a driver never checked in cannot hang every later browse.
+    """
+    def __init__(self, selenium_web_browser: str = "chrome", max_size: int = 2, max_pages: int = 20,
+                 checkout_timeout: float = None):
+        self.selenium_web_browser = selenium_web_browser
+        self.max_size = max_size
+        self.max_pages = max_pages
+        self.checkout_timeout = checkout_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._pages = dict()
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "checkouts": 0, "recycled": 0, "unhealthy": 0}
+
+    def checkout(self) -> WebDriver:
+        """Takes a warm driver from the pool, launching a browser if none is idle"""
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise TimeoutError(f"No {self.selenium_web_browser} driver returned to the pool within "
+                               f"{self.checkout_timeout}s, all {self.max_size} are checked out")
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = get_web_driver(self.selenium_web_browser)
+                    with self._lock:
+                        self.stats["created"] += 1
+                        self._pages[id(driver)] = 0
+                    break
+                if is_driver_alive(driver):
+                    break
+                self._discard(driver, "unhealthy")
+        except:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.stats["checkouts"] += 1
+        return driver
+
+    def checkin(self, driver: WebDriver, discard: bool = False) -> None:
+        """Returns a driver to the pool, quitting it if it is broken or has served `max_pages` pages"""
+        try:
+            with self._lock:
+                self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+                worn_out = self._pages[id(driver)] >= self.max_pages
+            if discard:
+                self._discard(driver, "unhealthy")
+            elif worn_out:
+                self._discard(driver, "recycled")
+            else:
+                try:
+                    driver.delete_all_cookies()
+                    self._idle.put(driver)
+                except Exception:
+                    self._discard(driver, "unhealthy")
+        finally:
+            self._slots.release()
+
+    def _discard(self, driver: WebDriver, reason: str) -> None:
+        with self._lock:
+            self._pages.pop(id(driver), None)
+            self.stats[reason] += 1
+        quit_driver(driver)
+
+    @contextmanager
+    def driver(self):
+        """Checks out a driver for the duration of the with block"""
+        driver = self.checkout()
+        try:
+            yield driver
+        except:
+            self.checkin(driver, discard=not is_driver_alive(driver))
+            raise
+        else:
+            self.checkin(driver)
+
+    @asynccontextmanager
+    async def adriver(self):
+        """Async variant of `driver`, waits for a free driver without blocking the event loop"""
+        driver = await asyncio.to_thread(self.checkout)
+        try:
+            yield driver
+        except:
+            await asyncio.to_thread(self.checkin, driver, not is_driver_alive(driver))
+            raise
+        else:
+            await asyncio.to_thread(self.checkin, driver)
+
+    def close(self) -> None:
+        """Quits all idle drivers"""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver, "recycled")
+
+
+_DRIVER_POOLS = dict()
+_DRIVER_POOLS_LOCK = threading.Lock()
+_FINALIZER_PID = None
+
+
+def get_driver_pool(selenium_web_browser: str = "chrome") -> WebDriverPool:
+    """Returns the process-wide driver pool of a browser"""
+    global _FINALIZER_PID
+    with _DRIVER_POOLS_LOCK:
+        pool = _DRIVER_POOLS.get(selenium_web_browser)
+        if pool is None:
+            pool = WebDriverPool(selenium_web_browser, max_size=CFG.selenium_pool_size,
+                                 max_pages=CFG.selenium_max_pages_per_driver,
+                                 checkout_timeout=CFG.selenium_checkout_timeout)
+            _DRIVER_POOLS[selenium_web_browser] = pool
+        if _FINALIZER_PID != os.getpid():
+            # atexit handlers do not run in pool workers, multiprocessing finalizers do
+            util.Finalize(None, close_driver_pools, exitpriority=5)
+            _FINALIZER_PID = os.getpid()
+    return pool
+
+
+def get_driver_pool_stats() -> dict:
+    with _DRIVER_POOLS_LOCK:
+        return {name: dict(pool.stats) for name, pool in _DRIVER_POOLS.items()}
+
+
+def close_driver_pools() -> None:
+    with _DRIVER_POOLS_LOCK:
+        for pool in _DRIVER_POOLS.values():
+            pool.close()
+
+
 def get_pagesource_with_selenium(url: str, selenium_web_browser:str, driver: WebDriver = None) -> str:
+    """Loads a url in a browser and returns the html of its body
+
+    Uses `driver` when given, otherwise a driver checked out from the pool of `selenium_web_browser`.
+    """
     logging.getLogger("selenium").setLevel(logging.CRITICAL)
-    driver = get_web_driver(selenium_web_browser)
     if driver is None:
-        driver = get_web_driver(selenium_web_browser)
-    
+        with get_driver_pool(selenium_web_browser).driver() as driver:
+            return get_pagesource_with_selenium(url, selenium_web_browser, driver)
+
     driver.get(url)
 
     WebDriverWait(driver, 10).until(
@@ -63,7 +227,7 @@ def get_pagesource_with_selenium(url: str, selenium_web_browser:str, driver: Web
 
     # Get the HTML content directly from the browser's DOM
     page_source = driver.execute_script("return document.body.outerHTML;")
-    return driver, page_source
+    return page_source
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+"""Process-wide tokenizer registry"""
+import threading
+from pathlib import Path
+
+from transformers import AutoTokenizer
+
+
+GPT2_TOKENIZER_PATH = str(Path(__file__).parent.parent / 'resources/gpt2')
+
+_TOKENIZERS = dict()
+_TOKENIZERS_LOCK = threading.Lock()
+
+
+def get_tokenizer_name(llm_name: str) -> str:
+    """Map an LLM name to the tokenizer of its model family
+
+    Args:
+        llm_name (str): The name of the LLM
+
+    Returns:
+        str: The hub id or local path of the tokenizer
+    """
+    if "baichuan" in llm_name:
+        return "kwaikeg/kagentlms_baichuan2_13b_mat"
+    elif "qwen_7b" in llm_name:
+        return "kwaikeg/kagentlms_qwen_7b_mat"
+    return GPT2_TOKENIZER_PATH
+
+
+def load_tokenizer(model_name: str, use_fast: bool = True):
+    """Load a tokenizer from disk or the hub, bypassing the registry
+
+    The Rust (fast) implementation is used whenever the model ships one,
+    AutoTokenizer falls back to the python implementation otherwise.
+    """
+    return AutoTokenizer.from_pretrained(
+        model_name,
+        use_fast=use_fast,
+        padding_side='left',
+        trust_remote_code=True
+    )
+
+
+def get_tokenizer(llm_name: str):
+    """Return the shared tokenizer of the model family of `llm_name`
+
+    Each tokenizer is loaded once per process and shared by all agents,
+    the returned object must therefore be treated as read-only.
+
+    Args:
+        llm_name (str): The name of the LLM
+
+    Returns:
+        PreTrainedTokenizerBase: The tokenizer
+    """
+    model_name = get_tokenizer_name(llm_name)
+    tokenizer = _TOKENIZERS.get(model_name)
+    if tokenizer is None:
+        with _TOKENIZERS_LOCK:
+            tokenizer = _TOKENIZERS.get(model_name)
+            if tokenizer is None:
+                tokenizer = load_tokenizer(model_name)
+                _TOKENIZERS[model_name] = tokenizer
+    return tokenizer
+
+
+def clear_tokenizers():
+    """Drop all cached tokenizers"""
+    with _TOKENIZERS_LOCK:
+        _TOKENIZERS.clear()
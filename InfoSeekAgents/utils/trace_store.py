@@ -0,0 +1,82 @@
+"""Content-addressed store of the bulky traces of batch results
+
+The history and the LLM prompts and responses of a result are moved to a SQLite file,
+where every prompt, response and history is stored once, zlib-compressed, under the hash
+of its content. The result keeps a `trace_id` referencing the trace that lists them.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import threading
+
+from .cache_utils import SQLiteCache
+
+
+TRACE_FIELDS = ("history", "full_llm_prompt_responses")
+
+_STORES = dict()
+_STORES_LOCK = threading.Lock()
+
+
+def get_trace_store(path: str) -> SQLiteCache:
+    """Returns the process-wide trace store in `path`"""
+    if path not in _STORES:
+        with _STORES_LOCK:
+            if path not in _STORES:
+                # never evicted, a trace stays retrievable as long as its result
+                _STORES[path] = SQLiteCache(path, max_bytes=1 << 62)
+    return _STORES[path]
+
+
+def get_content_hash(value) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def store_trace(store: SQLiteCache, result: dict) -> dict:
+    """Moves the traces of `result` to `store`, returns the result with a `trace_id` in their place"""
+    blobs = dict()
+
+    def ref(value):
+        key = "blob:" + get_content_hash(value)
+        blobs[key] = value
+        return key
+
+    trace = {
+        "history": ref(result["history"]),
+        "full_llm_prompt_responses": [
+            dict(item, prompt=ref(item["prompt"]), response=ref(item["response"]))
+            for item in result["full_llm_prompt_responses"]
+        ],
+    }
+    trace_id = get_content_hash(trace)
+    blobs["trace:" + trace_id] = trace
+    stored = store.set_many(blobs, replace=False)
+    store.incr("traces")
+    store.incr("blobs", len(blobs))
+    store.incr("stored_blobs", stored)
+
+    result = {key: val for key, val in result.items() if key not in TRACE_FIELDS}
+    result["trace_id"] = trace_id
+    return result
+
+
+def load_trace(store: SQLiteCache, trace_id: str) -> dict:
+    """Returns the traces of a result as they were in it, `result.update(load_trace(store, result["trace_id"]))`"""
+    trace = store.get("trace:" + trace_id)
+    if trace is None:
+        raise KeyError(f"Trace {trace_id} not found in {store.path}")
+    return {
+        "history": store.get(trace["history"]),
+        "full_llm_prompt_responses": [
+            dict(item, prompt=store.get(item["prompt"]), response=store.get(item["response"]))
+            for item in trace["full_llm_prompt_responses"]
+        ],
+    }
+
+
+def format_trace_report(before: dict, after: dict) -> str:
+    """Describes the traces stored between two `counters()` snapshots of a trace store"""
+    delta = {key: after.get(key, 0) - before.get(key, 0) for key in ("traces", "blobs", "stored_blobs")}
+    dedup = 1 - delta["stored_blobs"] / delta["blobs"] if delta["blobs"] else 0.
+    return (f"Trace store: {delta['traces']} traces, {delta['stored_blobs']} of {delta['blobs']} blobs new, "
+            f"{dedup:.1%} deduplicated, {after.get('bytes', 0) / 2 ** 20:.1f} MB on disk")
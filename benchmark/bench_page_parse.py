@@ -0,0 +1,92 @@
+"""Parse time and peak memory per browsed page: two html.parser soups vs one lxml DOM
+
+Usage:
+    python -m benchmark.bench_page_parse --fixtures_dir path/to/saved_html
+Without --fixtures_dir a synthetic Wikipedia-sized page is used. Peak memory is measured
+with tracemalloc, which sees python allocations only, not the ones libxml2 makes itself.
+"""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from InfoSeekAgents.utils.html_utils import extract_hyperlinks, format_hyperlinks, parse_page
+
+
+def legacy_parse(page_source, url):
+    """Text and links as browse_website used to extract them, one soup each"""
+    soup = BeautifulSoup(page_source, "html.parser")
+    for script in soup(["script", "style"]):
+        script.extract()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    text = "\n".join(chunk for chunk in chunks if chunk)
+
+    soup = BeautifulSoup(page_source, "html.parser")
+    for script in soup(["script", "style"]):
+        script.extract()
+    links = format_hyperlinks(extract_hyperlinks(soup, url))
+    return text, links
+
+
+def single_parse(page_source, url):
+    text, hyperlinks = parse_page(page_source, url)
+    return text, format_hyperlinks(hyperlinks)
+
+
+def make_page(num_sections=300):
+    sections = []
+    for i in range(num_sections):
+        sections.append(
+            f'<h2 id="s{i}">Section {i}</h2><p>Tuvalu is an island country in the Polynesian subregion of '
+            f'Oceania in the <a href="/wiki/Pacific_Ocean">Pacific Ocean</a>, about midway between '
+            f'<a href="/wiki/Hawaii">Hawaii</a> and <a href="/wiki/Australia">Australia</a>.</p>'
+            f'<table><tr><th>Year</th><th>Population</th></tr><tr><td>{1900 + i}</td><td>{i * 37}</td></tr></table>'
+            f'<script>window.section{i} = {{"id": {i}}};</script>'
+        )
+    return f'<html><head><style>p {{margin: 0}}</style></head><body>{"".join(sections)}</body></html>'
+
+
+def measure(fn, page_source, url, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(page_source, url)
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    fn(page_source, url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures_dir", type=str, default=None, help="Directory of saved *.html pages")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per measurement")
+    args = parser.parse_args()
+
+    if args.fixtures_dir:
+        pages = {}
+        for path in sorted(glob.glob(os.path.join(args.fixtures_dir, "*.html"))):
+            with open(path, "r", encoding="utf-8", errors="replace") as file:
+                pages[os.path.basename(path)] = file.read()
+    else:
+        pages = {"synthetic_wiki.html": make_page()}
+
+    url = "https://en.wikipedia.org/wiki/Tuvalu"
+    for name, page_source in pages.items():
+        legacy_time, legacy_peak = measure(legacy_parse, page_source, url, args.repeat)
+        single_time, single_peak = measure(single_parse, page_source, url, args.repeat)
+        print(f"{name} ({len(page_source) / 1024:.0f} KB)")
+        print(f"  two html.parser soups: {legacy_time * 1000:8.1f} ms, peak {legacy_peak / 2 ** 20:6.1f} MB")
+        print(f"  one lxml DOM         : {single_time * 1000:8.1f} ms, peak {single_peak / 2 ** 20:6.1f} MB")
+        print(f"  saved                : {(legacy_time - single_time) * 1000:8.1f} ms, "
+              f"{(legacy_peak - single_peak) / 2 ** 20:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Micro-benchmark of prompt_truncate on realistic memory sizes
+
+Usage:
+    python -m benchmark.bench_prompt_truncate --memory_tokens 2000 8000 16000 --max_tokens_num 4096
+Each prompt is also truncated to half the tokens of its text outside the memory, which
+only cutting the whole prompt can reach, and checked to be within that budget.
+"""
+import argparse
+import json
+import time
+
+from InfoSeekAgents.agents.prompts import prompt_truncate, conclusion_prompt_template_en
+from InfoSeekAgents.utils.tokenizer_utils import get_tokenizer
+
+
+def legacy_prompt_truncate(tokenizer, prompt, memory, input_max_length):
+    """The sub-list scan implementation prompt_truncate replaced"""
+    kwargs = dict(add_special_tokens=False)
+    prompt_tokens = tokenizer.encode(prompt, **kwargs)
+    if len(prompt_tokens) > input_max_length:
+        if memory is None or memory not in prompt:
+            prompt_tokens = prompt_tokens[:input_max_length//2] + prompt_tokens[-input_max_length//2:]
+        else:
+            memory_prompt_tokens = tokenizer.encode(memory, add_special_tokens=False)
+            sublst_len = len(memory_prompt_tokens)
+            start_index = None
+            for i in range(len(prompt_tokens) - sublst_len + 1):
+                if prompt_tokens[i:i+sublst_len] == memory_prompt_tokens:
+                    start_index = i
+                    break
+
+            if start_index is None:
+                prompt_tokens = prompt_tokens[:input_max_length//2] + prompt_tokens[-input_max_length//2:]
+            else:
+                other_len = len(prompt_tokens) - sublst_len
+                if input_max_length > other_len:
+                    max_memory_len = input_max_length - other_len
+                    memory_prompt_tokens = memory_prompt_tokens[:max_memory_len//2] + memory_prompt_tokens[-max_memory_len//2:]
+                    prompt_tokens = prompt_tokens[:start_index] + memory_prompt_tokens + prompt_tokens[start_index + sublst_len:]
+    prompt = tokenizer.decode(prompt_tokens, skip_special_tokens=True)
+    return prompt
+
+
+def make_memory(tokenizer, num_tokens):
+    """Build a memory string shaped like InfoSeekAgent.memory_retrival output"""
+    task = {
+        "task_name": "Search for the population ranking of countries in 2017",
+        "command": {"name": "web_search", "args": {"text": "2017 list of countries by population"}},
+        "result": "title: List of countries and dependencies by population - Wikipedia\n"
+                  "body: This is a list of countries and dependencies by population. "
+                  "It includes sovereign states, inhabited dependent territories.\n"
+                  "url: https://en.wikipedia.org/wiki/List_of_countries_and_dependencies_by_population\n" * 3,
+    }
+    complete_task_list = []
+    memory = ""
+    while len(tokenizer.encode(memory, add_special_tokens=False)) < num_tokens:
+        task = dict(task, task_id=len(complete_task_list) + 1)
+        complete_task_list.append(task)
+        memory = f"* Complete tasks: {json.dumps(complete_task_list, ensure_ascii=False, indent=4)}\n"
+    return memory
+
+
+def count_tokens(tokenizer, text):
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm_name", type=str, default="gpt-4o", help="the name of llm")
+    parser.add_argument("--memory_tokens", type=int, nargs="+", default=[2000, 8000, 16000],
+                        help="Approximate memory sizes in tokens")
+    parser.add_argument("--max_tokens_num", type=int, default=4096, help="Maximum number of token")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per measurement")
+    args = parser.parse_args()
+
+    tokenizer = get_tokenizer(args.llm_name)
+    for num_tokens in args.memory_tokens:
+        memory = make_memory(tokenizer, num_tokens)
+        prompt = conclusion_prompt_template_en.format(
+            agent_name="AI Assitant", agent_bio="You can help people solve their problems", agent_instructions="",
+            current_date_and_time="", memory=memory, goal="When did the country ranked 221st gain independence?")
+
+        legacy = timeit(lambda: legacy_prompt_truncate(tokenizer, prompt, memory, args.max_tokens_num), args.repeat)
+        current = timeit(lambda: prompt_truncate(tokenizer, prompt, memory, args.max_tokens_num), args.repeat)
+        truncated = prompt_truncate(tokenizer, prompt, memory, args.max_tokens_num)
+        print(f"memory ~{num_tokens:>6} tokens | legacy {legacy * 1000:9.2f} ms | offset-aware {current * 1000:9.2f} ms"
+              f" | speedup {legacy / max(current, 1e-9):6.1f}x"
+              f" | output {count_tokens(tokenizer, truncated)} tokens")
+
+        budget = count_tokens(tokenizer, prompt.replace(memory, "")) // 2
+        truncated = prompt_truncate(tokenizer, prompt, memory, budget)
+        assert count_tokens(tokenizer, truncated) <= budget, (count_tokens(tokenizer, truncated), budget)
+        print(f"memory ~{num_tokens:>6} tokens | budget below the rest of the prompt, output "
+              f"{count_tokens(tokenizer, truncated)} of {budget} tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Time to find the finished queries of a result file: parsing every record vs the key scan vs the index
+
+Each result file is then resumed after a simulated crash, which cut its last record short,
+to check that the records appended next are read back and indexed.
+
+Usage:
+    python -m benchmark.bench_resume --num_records 1000 --record_kb 256 --work_dir /tmp/bench_resume
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import string
+import time
+
+from InfoSeekAgents.utils.result_writer import (
+    ResultWriter, get_index_path, load_finished_keys, read_results, scan_keys
+)
+
+
+def legacy_keys(path, key):
+    """get_unfinished_data as it was: every record parsed for its key"""
+    return [query[key] for query in read_results(path)]
+
+
+def make_record(i, record_kb, rng):
+    prompt = "".join(rng.choices(string.ascii_letters + " ", k=1024))
+    return {
+        "id": i,
+        "query_en": f"Question {i} about \"something\"?",
+        "answer_en": f"Answer {i}",
+        "result": {
+            "id": str(i),
+            "response": f"Response {i}",
+            "more_info": [f"https://example.com/{i}"],
+            "full_llm_prompt_responses": [{"prompt": prompt, "query_en": "nested"}] * record_kb,
+        },
+    }
+
+
+def check_resume_after_crash(path, key, rng):
+    """Appends a cut off record, resumes as agent_start does and appends two more records"""
+    finished = load_finished_keys(path, key)
+    data = (json.dumps(make_record(-1, 1, rng)) + "\n").encode("utf-8")
+    with open(path, "ab") as file:
+        file.write((gzip.compress(data) if path.endswith(".gz") else data)[:len(data) // 2])
+    finished = load_finished_keys(path, key)
+    with ResultWriter(path, key=key) as writer:
+        for i in range(-3, -1):
+            record = make_record(i, 1, rng)
+            writer.put(record)
+            finished.append(record[key])
+    assert legacy_keys(path, key) == load_finished_keys(path, key) == finished
+
+
+def timeit(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_records", type=int, default=1000, help="Records in the result file")
+    parser.add_argument("--record_kb", type=int, default=256, help="Approximate size of a record in KB")
+    parser.add_argument("--work_dir", type=str, default="/tmp/bench_resume", help="Directory of the result files")
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    rng = random.Random(0)
+    for name in ["results.jsonl", "results.jsonl.gz"]:
+        path = os.path.join(args.work_dir, name)
+        for file_path in [path, get_index_path(path)]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        with ResultWriter(path, key="query_en") as writer:
+            for i in range(args.num_records):
+                writer.put(make_record(i, args.record_kb, rng))
+
+        legacy_time, expected = timeit(legacy_keys, path, "query_en")
+        scan_time, scanned = timeit(scan_keys, path, "query_en")
+        index_time, indexed = timeit(load_finished_keys, path, "query_en")
+        assert expected == scanned == indexed
+        print(f"{name:<17} {os.path.getsize(path) / 2 ** 20:8.1f} MB | parse {legacy_time * 1000:8.1f} ms | "
+              f"key scan {scan_time * 1000:8.1f} ms | index {index_time * 1000:6.1f} ms")
+        check_resume_after_crash(path, "query_en", rng)
+        print(f"{name:<17} resumed after a crash, the records appended next are read back and indexed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Collection and merge time of search results: list scans vs the SearchResults hash indexes
+
+Usage:
+    python -m benchmark.bench_search_results --num_results 1000 5000 10000
+"""
+import argparse
+import random
+import time
+
+from InfoSeekAgents.tools.search_engines import utils
+from InfoSeekAgents.tools.search_engines.engine import SearchEngine
+from InfoSeekAgents.tools.search_engines.multiple_search_engines import MultipleSearchEngines
+
+
+class LegacySearchResults(object):
+    """SearchResults before the indexes: a list, `in` compares against every item"""
+    def __init__(self):
+        self._results = []
+
+    def links(self):
+        return [row.get('link') for row in self._results]
+
+    def hosts(self):
+        return [row.get('host') for row in self._results]
+
+    def __getitem__(self, index):
+        return self._results[index]
+
+    def append(self, item):
+        self._results.append(item)
+
+
+def legacy_collect(items, ignore_duplicate_urls=True, ignore_duplicate_domains=False):
+    """SearchEngine._collect_results as it was"""
+    results = LegacySearchResults()
+    for item in items:
+        if not utils.is_url(item['link']):
+            continue
+        if item in results:
+            continue
+        if ignore_duplicate_urls and item['link'] in results.links():
+            continue
+        if ignore_duplicate_domains and item['host'] in results.hosts():
+            continue
+        results.append(item)
+    return results
+
+
+def indexed_collect(items, ignore_duplicate_urls=True, ignore_duplicate_domains=False):
+    engine = SearchEngine()
+    engine.ignore_duplicate_urls = ignore_duplicate_urls
+    engine.ignore_duplicate_domains = ignore_duplicate_domains
+    engine._collect_results(items)
+    return engine.results
+
+
+def legacy_merge(engine_results_list):
+    """MultipleSearchEngines.search merging as it was, with ignore_duplicate_urls"""
+    results = LegacySearchResults()
+    for engine_results in engine_results_list:
+        results._results += [item for item in engine_results if item['link'] not in results.links()]
+    return results
+
+
+def indexed_merge(engine_results_list):
+    multiple = MultipleSearchEngines([])
+    multiple.ignore_duplicate_urls = True
+    for engine_results in engine_results_list:
+        multiple._merge(SearchEngine(), engine_results)
+    return multiple.results
+
+
+def make_items(num_results, duplicate_ratio=0.3, seed=0):
+    rng = random.Random(seed)
+    unique = max(1, int(num_results * (1 - duplicate_ratio)))
+    items = []
+    for _ in range(num_results):
+        i = rng.randrange(unique)
+        host = f"site{i % 200}.example.com"
+        items.append({
+            'host': host,
+            'link': f"https://{host}/page/{i}",
+            'title': f"Result {i}",
+            'text': f"Snippet of result {i} about the query",
+        })
+    return items
+
+
+def timeit(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_results", type=int, nargs="+", default=[1000, 5000, 10000],
+                        help="Numbers of synthetic results per run")
+    parser.add_argument("--num_engines", type=int, default=12, help="Engines merged in the merge benchmark")
+    args = parser.parse_args()
+
+    for num_results in args.num_results:
+        items = make_items(num_results)
+        legacy_time, legacy = timeit(legacy_collect, items)
+        indexed_time, indexed = timeit(indexed_collect, items)
+        assert legacy._results == indexed.results()
+        print(f"collect {num_results:>6} results | legacy {legacy_time * 1000:9.1f} ms | "
+              f"indexed {indexed_time * 1000:7.1f} ms | speedup {legacy_time / max(indexed_time, 1e-9):7.1f}x")
+
+        per_engine = num_results // args.num_engines
+        # every engine de-duplicates its own results while collecting them
+        engine_results_list = [
+            indexed_collect(make_items(per_engine, seed=seed)) for seed in range(args.num_engines)
+        ]
+        legacy_time, legacy = timeit(legacy_merge, engine_results_list)
+        indexed_time, indexed = timeit(indexed_merge, engine_results_list)
+        assert legacy._results == indexed.results()
+        print(f"merge   {num_results:>6} results | legacy {legacy_time * 1000:9.1f} ms | "
+              f"indexed {indexed_time * 1000:7.1f} ms | speedup {legacy_time / max(indexed_time, 1e-9):7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Parse time per result page of every engine in search_engines_dict, per parser backend
+
+Usage:
+    python -m benchmark.bench_serp_parse
+    python -m benchmark.bench_serp_parse --capture --fixtures_dir benchmark/serp_fixtures --query "tuvalu independence"
+    python -m benchmark.bench_serp_parse --fixtures_dir benchmark/serp_fixtures
+Without --fixtures_dir synthetic result pages are used, built from the markup each engine's
+selectors expect and padded with inline scripts and styles to the size of a real page.
+--capture saves the first result page of every engine as <engine>.html, the last command
+parses the saved pages with each backend: the page, its result items and its next page link.
+For google, "legacy" is the former html.parser parse plus the re-parse of the result items.
+"""
+import argparse
+import base64
+import json
+import os
+import time
+from urllib.parse import quote
+
+from bs4 import BeautifulSoup
+
+from InfoSeekAgents.tools.search_engines.engines import search_engines_dict
+from InfoSeekAgents.tools.search_engines.engines.google import Google
+
+
+def capture(fixtures_dir, query):
+    os.makedirs(fixtures_dir, exist_ok=True)
+    for name, engine_class in search_engines_dict.items():
+        engine = engine_class()
+        engine._query = query
+        try:
+            request = engine._first_page()
+            response = engine._get_page(request['url'], request['data'])
+        except Exception as e:
+            print(f"{name:<12} failed: {e}")
+            continue
+        if response.http != 200:
+            print(f"{name:<12} HTTP {response.http}, not saved")
+            continue
+        with open(os.path.join(fixtures_dir, f"{name}.html"), "w", encoding="utf-8") as file:
+            file.write(response.html)
+        print(f"{name:<12} saved {len(response.html) / 1024:.0f} KB")
+
+
+# (page, result item) templates matching the selectors of each engine
+SYNTHETIC_SERPS = {
+    "google": (
+        '<div id="main">{items}<div><div><a href="/url?q=https://support.google.com/&amp;sa=U">Help</a></div></div>'
+        '<footer><table><tr><td><a href="/search?q=tuvalu&amp;start=10">Next</a></td></tr></table></footer></div>',
+        '<div><div><a href="/url?q={url}&amp;sa=U&amp;ved=2ahUKEwi"><span>{title}</span></a></div>'
+        '<table><tr><td>{text}</td></tr></table></div>'
+    ),
+    "bing": (
+        '<div id="b_content"><ol id="b_results">{items}</ol>'
+        '<nav role="navigation"><a class="sb_pagN" href="/search?q=tuvalu&amp;first=11">Next</a></nav></div>',
+        '<li class="b_algo"><h2><a href="https://www.bing.com/ck/a?u=a1{bing_url}&amp;ntb=1">{title}</a></h2>'
+        '<div class="b_caption"><p>{text}</p></div></li>'
+    ),
+    "yahoo": (
+        '<div id="web"><ol>{items}</ol></div><a class="next" href="/search?p=tuvalu&amp;b=11">Next</a>',
+        '<li><div class="dd algo algo-sr"><div class="compTitle"><h3 class="title">'
+        '<a href="https://r.search.yahoo.com/_ylt=A0/RV=2/RE=1/RO=10/RU={quoted_url}/RK=2/RS=x-">'
+        '<span>example.org</span>{title}</a></h3></div><div class="compText"><p>{text}</p></div></div></li>'
+    ),
+    "duckduckgo": (
+        '<div class="results">{items}</div><div class="nav-link"><form action="/html/" method="post">'
+        '<input type="hidden" name="q" value="tuvalu"><input type="hidden" name="s" value="10"></form></div>',
+        '<div class="result results_links results_links_deep web-result"><h2 class="result__title">'
+        '<a href="{url}">{title}</a></h2><a class="result__snippet" href="{url}">{text}</a></div>'
+    ),
+    "startpage": (
+        '<section class="w-gl">{items}</section><form class="pagination__form" action="/sp/search" method="post">'
+        '<input type="hidden" name="page" value="2"><button type="submit">Next</button></form>',
+        '<div class="w-gl__result"><a class="w-gl__result-title" href="{url}"><h3>{title}</h3></a>'
+        '<a class="w-gl__result-url" href="{url}">{url}</a><p class="w-gl__description">{text}</p></div>'
+    ),
+    "dogpile": (
+        '<div class="web-bing__results">{items}</div>'
+        '<a class="pagination__num--next" href="/serp?q=tuvalu&amp;page=2">Next</a>',
+        '<div class="web-bing__result"><a class="web-bing__title" href="{url}">{title}</a>'
+        '<span class="web-bing__url">{url}</span><span class="web-bing__description">{text}</span></div>'
+    ),
+    "ask": (
+        '<div class="PartialSearchResults-body">{items}</div>'
+        '<ul><li class="PartialWebPagination-next"><a href="/web?q=tuvalu&amp;page=2">Next</a></li></ul>',
+        '<div class="PartialSearchResults-item"><a class="PartialSearchResults-item-title-link result-link" '
+        'href="{url}">{title}</a><p class="PartialSearchResults-item-abstract">{text}</p></div>'
+    ),
+    "mojeek": (
+        '<ul class="results-standard">{items}</ul>'
+        '<div class="pagination"><ul><li><a href="/search?q=tuvalu&amp;s=11">Next</a></li></ul></div>',
+        '<li><a class="ob" href="{url}">{title}</a><p class="s">{text}</p></li>'
+    ),
+    "brave": (
+        '<div id="results">{items}</div><div id="pagination"><a class="btn" href="/search?q=tuvalu&amp;offset=1">'
+        'Next</a></div>',
+        '<div data-loc="main"><a class="result-header" href="{url}"><span class="snippet-title">{title}</span></a>'
+        '<div class="snippet-content">{text}</div></div>'
+    ),
+    "torch": (
+        '<div class="results">{items}</div><ul class="pagination"><li><a class="page-link" '
+        'href="/search?query=tuvalu&amp;page=2">2</a></li></ul>',
+        '<div class="result mb-3"><h5><a href="{url}">{title}</a></h5><p>{text}</p></div>'
+    ),
+}
+SYNTHETIC_SERPS["aol"] = SYNTHETIC_SERPS["yahoo"]
+
+
+def make_serp(name, num_results=10, filler_kb=100):
+    """A synthetic first result page of an engine, None for the engines without a template"""
+    results = [{
+        "url": f"https://example{i}.org/tuvalu/independence-{i}",
+        "title": f"Tuvalu independence, part {i}",
+        "text": f"Tuvalu became independent on 1 October 1978, result {i} about the Ellice Islands. " * 3,
+    } for i in range(num_results)]
+    if name == "qwant":
+        items = [dict(result, desc=result.pop("text")) for result in results]
+        return json.dumps({"status": "success", "data": {"result": {"items": {"mainline": [
+            {"type": "web", "items": items}]}}}})
+    if name not in SYNTHETIC_SERPS:
+        return None
+    page, item = SYNTHETIC_SERPS[name]
+    items = "".join(item.format(
+        bing_url=base64.b64encode(result["url"].encode()).decode().rstrip("="),
+        quoted_url=quote(result["url"], safe=""), **result
+    ) for result in results)
+    # real result pages are mostly inline scripts and styles
+    filler = "".join(
+        f'<script>window.__state{i} = {{"id": {i}, "labels": ["tuvalu", "funafuti"], "ok": true}};</script>'
+        f'<style>.c{i} {{margin: {i % 8}px; color: #{i % 4096:03x}}}</style>'
+        for i in range(filler_kb * 1024 // 140)
+    )
+    return f'<html><head>{filler}</head><body>{page.format(items=items)}</body></html>'
+
+
+def parse_page(engine, html):
+    tags = engine._parse(html)
+    items = engine._filter_results(tags)
+    engine._next_page(tags)
+    return items
+
+
+def legacy_google_parse_page(engine, html):
+    """Google parsing as it was: html.parser, then every result item serialized and parsed again"""
+    tags = BeautifulSoup(html, "html.parser")
+    items = [i.find_parent('div').find_parent('div') for i in tags.select('div a[href^="/url?q="]')][:-1]
+    soup = BeautifulSoup(''.join('<item>' + str(i) + '</item>' for i in items), "html.parser")
+    items = [engine._item(tag) for tag in soup.select('item')]
+    engine._next_page(tags)
+    return items
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures_dir", type=str, default=None,
+                        help="Directory of saved <engine>.html result pages, default synthetic pages")
+    parser.add_argument("--capture", default=False, action='store_true',
+                        help="Fetch and save the first result page of every engine, needs network access")
+    parser.add_argument("--query", type=str, default="tuvalu independence", help="Query of the captured pages")
+    parser.add_argument("--parsers", type=str, nargs="+", default=["html.parser", "lxml"], help="Backends to compare")
+    parser.add_argument("--num_results", type=int, default=10, help="Results per synthetic page")
+    parser.add_argument("--filler_kb", type=int, default=100, help="Scripts and styles per synthetic page, in KB")
+    parser.add_argument("--repeat", type=int, default=10, help="Repetitions per measurement")
+    args = parser.parse_args()
+
+    if args.capture:
+        capture(args.fixtures_dir or "benchmark/serp_fixtures", args.query)
+        return
+
+    for name, engine_class in search_engines_dict.items():
+        if args.fixtures_dir:
+            path = os.path.join(args.fixtures_dir, f"{name}.html")
+            if not os.path.exists(path):
+                print(f"{name:<12} no fixture")
+                continue
+            with open(path, "r", encoding="utf-8") as file:
+                html = file.read()
+        else:
+            html = make_serp(name, args.num_results, args.filler_kb)
+            if html is None:
+                print(f"{name:<12} no synthetic page")
+                continue
+        engine = engine_class()
+        engine._query = args.query
+
+        timings = []
+        if engine_class is Google:
+            elapsed, items = timeit(lambda: legacy_google_parse_page(engine, html), args.repeat)
+            timings.append(f"legacy {elapsed * 1000:7.1f} ms ({len(items)} items)")
+        for backend in args.parsers:
+            engine.set_parser(backend)
+            elapsed, items = timeit(lambda: parse_page(engine, html), args.repeat)
+            timings.append(f"{backend} {elapsed * 1000:7.1f} ms ({len(items)} items)")
+        print(f"{name:<12} {len(html) / 1024:5.0f} KB | " + " | ".join(timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Per-query tokenizer setup cost, before and after the process-wide registry
+
+Usage:
+    python -m benchmark.bench_tokenizer --num_queries 20 --llm_name gpt-4o
+"""
+import argparse
+import time
+
+from InfoSeekAgents.utils.tokenizer_utils import get_tokenizer, get_tokenizer_name, load_tokenizer, clear_tokenizers
+
+
+def bench_legacy(model_name, num_queries):
+    """Every agent loads the slow python tokenizer, as InfoSeekAgent used to"""
+    start = time.perf_counter()
+    for _ in range(num_queries):
+        load_tokenizer(model_name, use_fast=False)
+    return (time.perf_counter() - start) / num_queries
+
+
+def bench_registry(llm_name, num_queries):
+    """The first agent loads the fast tokenizer, the following ones share it"""
+    clear_tokenizers()
+    start = time.perf_counter()
+    get_tokenizer(llm_name)
+    first = time.perf_counter() - start
+    for _ in range(num_queries - 1):
+        get_tokenizer(llm_name)
+    return first, (time.perf_counter() - start) / num_queries
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm_name", type=str, default="gpt-4o", help="the name of llm")
+    parser.add_argument("--num_queries", type=int, default=20, help="Number of simulated queries per worker")
+    args = parser.parse_args()
+
+    model_name = get_tokenizer_name(args.llm_name)
+    print(f"tokenizer: {model_name}, queries per worker: {args.num_queries}")
+
+    legacy = bench_legacy(model_name, args.num_queries)
+    first, registry = bench_registry(args.llm_name, args.num_queries)
+    print(f"legacy   (slow, load per query) : {legacy * 1000:10.2f} ms / query")
+    print(f"registry (fast, load once)      : {registry * 1000:10.2f} ms / query "
+          f"(first load {first * 1000:.2f} ms)")
+    print(f"speedup: {legacy / max(registry, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
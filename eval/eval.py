@@ -16,7 +16,10 @@ sys.path.insert(0, project_root)
 
 
 from InfoSeekAgents.llms import create_chat_completion
+from InfoSeekAgents.llms.cache import LLM_CACHE_MODES, get_llm_cache_counters
 from InfoSeekAgents.config import CFG
+from InfoSeekAgents.utils.cache_utils import format_cache_report
+from InfoSeekAgents.utils.result_writer import read_results
 
 
 # Chinese prompt for false premise questions
@@ -315,8 +318,7 @@ def process_file(input_path, output_path, model_name, reuse, num_worker):
     query_key = get_query_key(os.path.basename(input_path))
     temp_path = output_path + ".tmp"
 
-    with open(input_path, 'r', encoding='utf-8') as infile:
-        all_data = [json.loads((line.strip())) for line in infile]
+    all_data = list(read_results(input_path))
 
     if reuse and os.path.exists(output_path):
         reuse_data(output_path, temp_path, all_data, answer_key, query_key)
@@ -327,6 +329,7 @@ def process_file(input_path, output_path, model_name, reuse, num_worker):
         to_do_list = all_data
         print(f"No finished queries, process a new dataset with {len(all_data)} queries")
 
+    cache_counters = get_llm_cache_counters()
     # First stage processing
     total_lines = len(to_do_list)
     fail_num = 0
@@ -358,6 +361,8 @@ def process_file(input_path, output_path, model_name, reuse, num_worker):
             f_out.write(json.dumps(data, ensure_ascii=False) + '\n')
 
     os.remove(temp_path)
+    if CFG.llm_cache_mode != "off":
+        print(format_cache_report("LLM cache", cache_counters, get_llm_cache_counters()))
     print(f"\nProcessing completed! Unprocessed items:{fail_num}, saved in {output_path}")
 
 
@@ -373,8 +378,18 @@ if __name__ == "__main__":
                         help="Whether to reuse data from output path, default False")
     parser.add_argument("--num_worker", default=3, type=int,
                         help="The number of workers for multi-processing, default 3")
+    parser.add_argument("--llm_cache_path", type=str, default=None,
+                        help="SQLite file caching judge responses across runs, default None (no cache)")
+    parser.add_argument("--llm_cache_mode", type=str, default="readwrite", choices=LLM_CACHE_MODES,
+                        help="readwrite, readonly, or replay (misses fail instead of calling the API), default readwrite")
+    parser.add_argument("--llm_cache_max_mb", type=int, default=1024,
+                        help="Size of the LLM response cache above which least recently used entries are evicted, default 1024")
     args = parser.parse_args()
 
+    CFG.llm_cache_path = args.llm_cache_path
+    CFG.llm_cache_mode = args.llm_cache_mode if args.llm_cache_path else "off"
+    CFG.llm_cache_max_mb = args.llm_cache_max_mb
+
     if args.output_path is None:
         idx = os.path.basename(args.input_file).rfind('.json')
         output_file = os.path.join(os.path.dirname(args.input_file), os.path.basename(args.input_file)[:idx] + f'_{args.eval_llm_name}_score.jsonl')